@@ -9,6 +9,10 @@ from urllib.parse import parse_qs, urlparse
 import pandas as pd
 import base64
 import pytz
+from instrument_master import (
+    MASTER_COLUMNS, diff_masters, iter_master_rows, read_master_snapshot,
+    snapshot_path_for, source_fingerprint, write_master_snapshot
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +30,20 @@ FY_ID = "FA2060"
 TOTP_KEY = "FTJEBP37ZFWVUTGOBAJEXTS7D3CUPE7M"
 PIN = "5417"
 
+# Callbacks told about the token each time ensure_valid_token hands one out
+token_listeners = []
+
+def on_token_refresh(callback):
+    """Register a callback that receives the access token whenever it is validated or refreshed"""
+    token_listeners.append(callback)
+
+def notify_token_listeners(access_token):
+    for callback in token_listeners:
+        try:
+            callback(access_token)
+        except Exception as e:
+            logger.error(f"Error in token listener: {str(e)}")
+
 def getEncodedString(string):
     string = str(string)
     base64_bytes = base64.b64encode(string.encode("ascii"))
@@ -69,10 +87,13 @@ def ensure_valid_token():
         if is_token_valid():
             logger.info("Using existing valid token")
             with open(DATA_DIR / "access_token.txt", 'r') as f:
-                return f.read().strip()
+                access_token = f.read().strip()
+        else:
+            logger.info("Getting new access token")
+            access_token = get_access_token()
         
-        logger.info("Getting new access token")
-        return get_access_token()
+        notify_token_listeners(access_token)
+        return access_token
         
     except Exception as e:
         logger.error(f"Error ensuring valid token: {str(e)}")
@@ -153,36 +174,63 @@ def get_access_token():
         logger.error(f"Error in get_access_token: {str(e)}")
         raise
 
-def download_master_instruments():
+MASTER_URLS = {
+    "NSE_FO": "https://public.fyers.in/sym_details/NSE_FO_sym_master.json",
+    "BSE_FO": "https://public.fyers.in/sym_details/BSE_FO_sym_master.json"
+}
+
+def iter_source_chunks(source, chunk_size=1 << 16):
+    """Yield raw bytes from a symbol master URL or a local fixture file"""
+    if not str(source).startswith(("http://", "https://")):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+        return
+
+    with requests.get(source, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            yield chunk
+
+def download_master_instruments(sources=None, output_path=None):
+    """Stream the FO symbol masters into master_file.csv and report what changed"""
     try:
-        urls = {
-            "NSE_FO": "https://public.fyers.in/sym_details/NSE_FO_sym_master.json",
-            "BSE_FO": "https://public.fyers.in/sym_details/BSE_FO_sym_master.json"
-        }
+        sources = sources or MASTER_URLS
+        output_path = Path(output_path or DATA_DIR / "master_file.csv")
+        snapshot_path = snapshot_path_for(output_path)
 
-        df_all = pd.DataFrame()
-        for exchange, url in urls.items():
-            response = requests.get(url)
-            data = response.json()
-            df = pd.DataFrame.from_dict(data, orient='index')
-            df.reset_index(inplace=True)
-            df.rename(columns={'index': 'symbol'}, inplace=True)
-            
-            columns_to_keep = ['symbol', 'exSymbol', 'segment', 'exchange', 'expiryDate', 'strikePrice', 'exSymName']
-            df = df[columns_to_keep]
-            df = df[df['exSymbol'].isin(['NIFTY', 'BANKNIFTY','MIDCPNIFTY', 'FINNIFTY', 'SENSEX', 'BANKEX'])]
-            
-            # Add logging to check dates
-            logger.info(f"Sample raw expiry dates: {df['expiryDate'].head()}")
-            df['expiryDate'] = pd.to_datetime(df['expiryDate'], unit='s')
-            logger.info(f"Sample converted expiry dates: {df['expiryDate'].head()}")
-            
-            df_all = pd.concat([df_all, df])
+        # Previous master to diff against, from the snapshot if it is still around
+        previous = read_master_snapshot(snapshot_path)
+        if previous is None and output_path.exists():
+            previous = pd.read_csv(output_path)
+
+        # Rows are filtered while parsing so memory tracks the kept contracts only
+        rows = []
+        for exchange, source in sources.items():
+            kept_before = len(rows)
+            rows.extend(iter_master_rows(iter_source_chunks(source)))
+            logger.info(f"Kept {len(rows) - kept_before} contracts from {exchange}")
+
+        df_all = pd.DataFrame(rows, columns=MASTER_COLUMNS)
+        df_all['expiryDate'] = pd.to_datetime(pd.to_numeric(df_all['expiryDate']), unit='s')
+        logger.info(f"Sample converted expiry dates: {df_all['expiryDate'].head()}")
+
+        diff = None
+        if previous is not None:
+            diff = diff_masters(previous, df_all)
+            logger.info(
+                f"Master diff: {len(diff['added'])} added, {len(diff['expired'])} expired, "
+                f"{len(diff['changed'])} changed"
+            )
 
-        output_path = DATA_DIR / "master_file.csv"
         df_all.to_csv(output_path, index=False)
         logger.info(f"Master instruments data saved to {output_path}")
         
+        # Typed columnar snapshot the backend memory-maps instead of parsing the CSV
+        write_master_snapshot(df_all, snapshot_path, source_fingerprint(output_path))
+        
+        return diff
+        
     except Exception as e:
         logger.error(f"Error in download_master_instruments: {str(e)}")
         raise
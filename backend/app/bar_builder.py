@@ -0,0 +1,112 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+# Bar intervals built from the live feed, in seconds. Epoch-aligned buckets also line up
+# with IST wall-clock boundaries since IST is UTC+5:30.
+BAR_INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+}
+# Closed bars kept in memory per symbol and interval
+MAX_CLOSED_BARS = 500
+
+
+class BarBuilder:
+    """
+    Builds OHLCV bars per symbol and interval from ticks as they arrive.
+
+    Volume is the increase in the feed's cumulative vol_traded_today since the previous
+    tick; a drop (new session) starts counting again from the new total. A bar closes
+    when a tick lands in a later bucket, or when close_due() is called after its end.
+
+    Ticks older than the symbol's latest are late: one for an earlier bucket than the
+    forming bar (or one already closed) is dropped for that interval, and one inside the
+    forming bucket only widens its high/low. Late ticks never set a close or add volume,
+    since the later cumulative volume already counts their trades.
+    """
+
+    def __init__(self, intervals: Iterable[str] = tuple(BAR_INTERVALS), max_closed: int = MAX_CLOSED_BARS):
+        self.intervals = {name: BAR_INTERVALS[name] for name in intervals}
+        self.max_closed = max_closed
+        self._forming: Dict[Tuple[str, str], Dict] = {}
+        self._closed: Dict[Tuple[str, str], Deque[Dict]] = {}
+        # Start of the last bucket closed per (symbol, interval)
+        self._last_closed: Dict[Tuple[str, str], int] = {}
+        self._last_volume: Dict[str, int] = {}
+        # Timestamp of the latest tick per symbol
+        self._last_seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def update(self, tick: Dict) -> List[Dict]:
+        """Fold a tick into every interval's forming bar; returns the bars it closed"""
+        symbol = tick['symbol']
+        timestamp = int(tick['timestamp'])
+        price = tick['ltp']
+        closed = []
+
+        with self._lock:
+            late = timestamp < self._last_seen.get(symbol, timestamp)
+            cumulative = int(tick.get('volume', 0))
+            previous = self._last_volume.get(symbol)
+            if not late:
+                self._last_seen[symbol] = timestamp
+                self._last_volume[symbol] = cumulative
+            if late or previous is None:
+                volume = 0
+            elif cumulative >= previous:
+                volume = cumulative - previous
+            else:
+                volume = cumulative
+
+            for name, seconds in self.intervals.items():
+                key = (symbol, name)
+                start = timestamp - timestamp % seconds
+                bar = self._forming.get(key)
+                if bar is not None and start > bar['timestamp']:
+                    closed.append(self._close(key))
+                    bar = None
+                if bar is None:
+                    if start <= self._last_closed.get(key, -1):
+                        continue
+                    self._forming[key] = {
+                        'symbol': symbol, 'interval': name, 'timestamp': start,
+                        'open': price, 'high': price, 'low': price, 'close': price, 'volume': volume,
+                    }
+                elif start < bar['timestamp']:
+                    continue
+                else:
+                    bar['high'] = max(bar['high'], price)
+                    bar['low'] = min(bar['low'], price)
+                    if not late:
+                        bar['close'] = price
+                        bar['volume'] += volume
+        return closed
+
+    def close_due(self, now: float) -> List[Dict]:
+        """Close bars whose interval ended before `now`, for symbols that stopped ticking"""
+        with self._lock:
+            due = [key for key, bar in self._forming.items()
+                   if bar['timestamp'] + self.intervals[key[1]] <= now]
+            return [self._close(key) for key in due]
+
+    def _close(self, key: Tuple[str, str]) -> Dict:
+        bar = self._forming.pop(key)
+        self._last_closed[key] = bar['timestamp']
+        closed = self._closed.get(key)
+        if closed is None:
+            closed = self._closed[key] = deque(maxlen=self.max_closed)
+        closed.append(bar)
+        return dict(bar)
+
+    def bars(self, symbol: str, interval: str, limit: Optional[int] = None) -> List[Dict]:
+        """Closed bars, oldest first"""
+        with self._lock:
+            closed = list(self._closed.get((symbol, interval), ()))
+        return closed[-limit:] if limit else closed
+
+    def forming(self, symbol: str, interval: str) -> Optional[Dict]:
+        with self._lock:
+            bar = self._forming.get((symbol, interval))
+            return dict(bar) if bar is not None else None
@@ -0,0 +1,86 @@
+"""
+Per-tick broadcast cost as the number of websocket clients grows.
+
+Compares encoding every tick once per client (what send_json did) with the
+manager's encode-once fan-out. Run with: python bench_broadcast.py
+"""
+import asyncio
+import json
+import time
+
+from connection_manager import ConnectionManager, SlowConsumerPolicy
+
+TICKS = 2000
+CLIENT_COUNTS = [1, 10, 50, 200, 500]
+
+
+class NullWebSocket:
+    """Accepts frames without doing any I/O so only encode/queue cost is measured"""
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def make_tick(i: int) -> dict:
+    return {
+        'symbol': "NSE:NIFTY50-INDEX",
+        'timestamp': 1736135100 + i,
+        'ltp': 23500.0 + i * 0.05,
+        'open': 23450.0,
+        'high': 23550.0,
+        'low': 23400.0,
+        'prev_close': 23480.0,
+        'change': 20.0 + i * 0.05,
+        'change_percent': 0.09,
+        'volume': 1000 + i,
+    }
+
+
+async def drain(manager: ConnectionManager):
+    while any(client.pending for client in manager.clients.values()):
+        await asyncio.sleep(0)
+
+
+async def per_client_encoding(clients: int) -> float:
+    """Baseline: stdlib json.dumps once per client per tick"""
+    started = time.perf_counter()
+    for i in range(TICKS):
+        message = make_tick(i)
+        for _ in range(clients):
+            json.dumps(message)
+    return (time.perf_counter() - started) / TICKS
+
+
+async def encode_once(clients: int) -> float:
+    manager = ConnectionManager(SlowConsumerPolicy(max_queue=TICKS * 2, drop_lag_seconds=None))
+    for _ in range(clients):
+        await manager.connect(NullWebSocket())
+
+    started = time.perf_counter()
+    for i in range(TICKS):
+        manager.broadcast(make_tick(i))
+        if i % 100 == 0:
+            await drain(manager)
+    await drain(manager)
+    elapsed = (time.perf_counter() - started) / TICKS
+
+    await manager.stop()
+    return elapsed
+
+
+async def main():
+    print(f"{'clients':>8} {'per-client json (us/tick)':>26} {'encode once + fan-out (us/tick)':>32}")
+    for clients in CLIENT_COUNTS:
+        baseline = await per_client_encoding(clients)
+        shared = await encode_once(clients)
+        print(f"{clients:>8} {baseline * 1e6:>26.1f} {shared * 1e6:>32.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
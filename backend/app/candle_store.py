@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CANDLE_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+IST = "Asia/Kolkata"
+
+
+class CandleStore:
+    """Per-symbol append-only candle store, partitioned into one Parquet file per IST trading day"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def lock(self, symbol: str) -> threading.Lock:
+        """Per-symbol lock so concurrent requests for one symbol don't race on its files"""
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _symbol_dir(self, symbol: str) -> Path:
+        return self.root / symbol.replace(':', '_')
+
+    def meta(self, symbol: str) -> Dict[str, int]:
+        """Stored coverage for a symbol: covered_from and last_timestamp as epoch seconds"""
+        meta_path = self._symbol_dir(symbol) / "meta.json"
+        if not meta_path.exists():
+            return {}
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    def last_timestamp(self, symbol: str) -> Optional[int]:
+        return self.meta(symbol).get("last_timestamp")
+
+    def append(self, symbol: str, candles: pd.DataFrame, covered_from: Optional[int] = None):
+        """Merge new candles into the day partitions they fall in; later rows win on duplicates"""
+        symbol_dir = self._symbol_dir(symbol)
+        symbol_dir.mkdir(parents=True, exist_ok=True)
+        meta = self.meta(symbol)
+
+        if not candles.empty:
+            candles = candles[CANDLE_COLUMNS]
+            days = pd.to_datetime(candles["timestamp"], unit="s", utc=True).dt.tz_convert(IST).dt.strftime('%Y-%m-%d')
+            for day, day_candles in candles.groupby(days.to_numpy()):
+                partition = symbol_dir / f"{day}.parquet"
+                if partition.exists():
+                    day_candles = pd.concat([pd.read_parquet(partition), day_candles])
+                day_candles = day_candles.drop_duplicates("timestamp", keep="last").sort_values("timestamp")
+                tmp_path = partition.with_suffix(".parquet.tmp")
+                day_candles.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, partition)
+
+            meta["last_timestamp"] = max(int(candles["timestamp"].max()), meta.get("last_timestamp", 0))
+
+        if covered_from is not None:
+            meta["covered_from"] = min(covered_from, meta.get("covered_from", covered_from))
+
+        tmp_meta = symbol_dir / "meta.json.tmp"
+        with open(tmp_meta, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, symbol_dir / "meta.json")
+
+    def read(self, symbol: str, start: int, end: Optional[int] = None) -> pd.DataFrame:
+        """Stored candles with start <= timestamp < end, reading only the overlapping partitions"""
+        symbol_dir = self._symbol_dir(symbol)
+        first_day = pd.Timestamp(start, unit="s", tz="UTC").tz_convert(IST).strftime('%Y-%m-%d')
+        last_day = pd.Timestamp(end, unit="s", tz="UTC").tz_convert(IST).strftime('%Y-%m-%d') if end else None
+
+        frames = [
+            pd.read_parquet(partition)
+            for partition in sorted(symbol_dir.glob("*.parquet"))
+            if partition.stem >= first_day and (last_day is None or partition.stem <= last_day)
+        ]
+        if not frames:
+            return pd.DataFrame(columns=CANDLE_COLUMNS)
+
+        candles = pd.concat(frames, ignore_index=True)
+        mask = candles["timestamp"] >= start
+        if end is not None:
+            mask &= candles["timestamp"] < end
+        return candles[mask].reset_index(drop=True)
@@ -0,0 +1,466 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to clients dropped for lagging ("try again later")
+LAGGING_CLOSE_CODE = 1013
+
+# Accepted range for a client's micro-batch flush interval
+MIN_BATCH_MS = 10
+MAX_BATCH_MS = 1000
+
+# Tick encodings a client can ask for: full records, or changed fields keyed by a numeric symbol id
+ENCODINGS = ("json", "delta")
+
+# Symbols one client may subscribe to; every one of them can cost a slot on the capped broker socket
+MAX_SYMBOLS_PER_CLIENT = 100
+
+
+def encode_message(message: dict) -> str:
+    """Encode a message as a compact JSON text frame"""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, separators=(",", ":"))
+
+
+class SlowConsumerPolicy:
+    """How a client that falls behind the feed is treated"""
+
+    def __init__(self, max_queue: int = 500, conflate: bool = True,
+                 drop_lag_seconds: Optional[float] = 10.0, max_pending: Optional[int] = None):
+        # Backlog at which ticks start being conflated to the latest per symbol
+        self.max_queue = max_queue
+        self.conflate = conflate
+        # Drop the client once its oldest queued message is this old; None never drops
+        self.drop_lag_seconds = drop_lag_seconds
+        # Hard backlog cap; beyond it the client is dropped, or the message if dropping is off
+        self.max_pending = max_pending or max_queue * 2
+
+
+class ClientConnection:
+    """A websocket client with its own bounded send queue and writer task"""
+
+    def __init__(self, websocket: WebSocket, policy: SlowConsumerPolicy, encoding: str = "json"):
+        self.websocket = websocket
+        self.policy = policy
+        self.encoding = encoding
+        # Delta clients: symbol -> version of the last tick queued, deltas only apply on top of it
+        self.versions: Dict[str, int] = {}
+        self.task: Optional[asyncio.Task] = None
+        # None until the client subscribes: legacy clients receive every symbol
+        self.symbols: Optional[Set[str]] = None
+        # Seconds between batched frames; None sends one frame per tick
+        self.batch_interval: Optional[float] = None
+        self._last_flush = 0.0
+        # key -> (enqueued_at, encoded payload); keys are sequence numbers, or the symbol once conflating
+        self.pending: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self._seq = 0
+        self.sent = 0
+        self.conflated = 0
+        self.dropped_messages = 0
+
+    def lag(self) -> float:
+        """Age in seconds of the oldest message still waiting to be sent"""
+        if not self.pending:
+            return 0.0
+        enqueued_at, _ = next(iter(self.pending.values()))
+        return time.monotonic() - enqueued_at
+
+    def set_batch_interval(self, interval_ms: int):
+        """Coalesce ticks into one frame per interval (clamped), or 0 to send each tick on its own"""
+        if not interval_ms:
+            self.batch_interval = None
+        else:
+            self.batch_interval = min(max(int(interval_ms), MIN_BATCH_MS), MAX_BATCH_MS) / 1000
+            self._last_flush = time.monotonic()
+        self.ready.set()  # wake the writer so it picks up the new mode
+
+    def send(self, message: dict) -> str:
+        """Queue a message meant for this client only"""
+        return self.enqueue(encode_message(message))
+
+    def enqueue(self, payload: str, symbol: Optional[str] = None) -> str:
+        """Queue an encoded frame without waiting. Returns queued, coalesced, conflated, discarded or lagging."""
+        policy = self.policy
+        batching = self.batch_interval is not None
+
+        if symbol and (batching or (policy.conflate and len(self.pending) >= policy.max_queue)):
+            key = ("symbol", symbol)
+            if key in self.pending:
+                # Keep the original enqueue time so lag still reflects how far behind we are
+                enqueued_at, _ = self.pending[key]
+                self.pending[key] = (enqueued_at, payload)
+                if batching:
+                    return "coalesced"
+                self.conflated += 1
+                return "conflated"
+        else:
+            self._seq += 1
+            key = self._seq
+
+        if len(self.pending) >= policy.max_pending:
+            if policy.drop_lag_seconds is not None:
+                return "lagging"
+            self.dropped_messages += 1
+            return "discarded"
+
+        self.pending[key] = (time.monotonic(), payload)
+        self.ready.set()
+
+        if policy.drop_lag_seconds is not None and self.lag() > policy.drop_lag_seconds:
+            return "lagging"
+        return "queued"
+
+    async def next_payload(self) -> str:
+        while not self.pending:
+            self.ready.clear()
+            await self.ready.wait()
+        _, (_, payload) = self.pending.popitem(last=False)
+        return payload
+
+    async def next_frames(self) -> List[str]:
+        """Frames to send next: one per tick, or a batch of the latest tick per symbol per interval"""
+        while not self.pending:
+            self.ready.clear()
+            await self.ready.wait()
+        if self.batch_interval is None:
+            return [await self.next_payload()]
+
+        delay = self._last_flush + self.batch_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        entries = list(self.pending.items())
+        self.pending.clear()
+        self._last_flush = time.monotonic()
+
+        # Control replies go out as they are; ticks share one frame
+        frames = [payload for key, (_, payload) in entries if not isinstance(key, tuple)]
+        updates = [payload for key, (_, payload) in entries if isinstance(key, tuple)]
+        if updates:
+            frames.append('{"type":"batch","updates":[' + ",".join(updates) + ']}')
+        return frames
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "symbols": sorted(self.symbols) if self.symbols is not None else None,
+            "encoding": self.encoding,
+            "batch_ms": int(self.batch_interval * 1000) if self.batch_interval else 0,
+            "pending": len(self.pending),
+            "lag_seconds": round(self.lag(), 3),
+            "sent": self.sent,
+            "conflated": self.conflated,
+            "dropped_messages": self.dropped_messages,
+        }
+
+
+class ConnectionManager:
+    """Fans messages out to websocket clients from the server's event loop"""
+
+    def __init__(self, policy: Optional[SlowConsumerPolicy] = None, max_symbols: int = MAX_SYMBOLS_PER_CLIENT):
+        self.policy = policy or SlowConsumerPolicy()
+        self.max_symbols = max_symbols
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # symbol -> clients subscribed to it, plus clients that take everything
+        self.routes: Dict[str, Set[ClientConnection]] = {}
+        self.wildcard: Set[ClientConnection] = set()
+        # Upstream feed subscriptions, reference counted across clients
+        self.upstream_refs: Dict[str, int] = {}
+        self.pinned: Set[str] = set()
+        # Latest tick per symbol, replayed to clients as a snapshot when they connect or subscribe
+        self.latest: Dict[str, dict] = {}
+        # Per-symbol tick counter and the compact ids delta clients see instead of symbol names
+        self.versions: Dict[str, int] = {}
+        self.symbol_ids: Dict[str, int] = {}
+        self._upstream_subscribe: Optional[Callable[[List[str]], None]] = None
+        self._upstream_unsubscribe: Optional[Callable[[List[str]], None]] = None
+        # One worker, so (un)subscribe calls reach the feed in the order they were made
+        self._upstream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feed-subscriptions")
+        self.conflated = 0
+        self.dropped_messages = 0
+        self.dropped_clients = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    def set_upstream(self, subscribe: Callable[[List[str]], None], unsubscribe: Callable[[List[str]], None],
+                     pinned: Iterable[str] = ()):
+        """Hooks that (un)subscribe symbols on the market feed; pinned symbols are never unsubscribed"""
+        self._upstream_subscribe = subscribe
+        self._upstream_unsubscribe = unsubscribe
+        self.pinned = set(pinned)
+
+    def upstream_symbols(self) -> List[str]:
+        """Symbols at least one client is subscribed to"""
+        return sorted(self.upstream_refs)
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Bind the manager to the loop that owns the websockets"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    async def stop(self):
+        """Cancel every writer task and forget the last ticks"""
+        for websocket in list(self.clients):
+            self.disconnect(websocket)
+        self.latest.clear()
+
+    async def connect(self, websocket: WebSocket, encoding: str = "json") -> ClientConnection:
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        if self.loop is None or self.loop.is_closed():
+            self.start()
+        # Register before accepting so nothing broadcast during the handshake is missed
+        client = ClientConnection(websocket, self.policy, encoding)
+        self.clients[websocket] = client
+        self.wildcard.add(client)
+        # Queued ahead of any tick broadcast from here on, so the snapshot is never newer than what follows
+        self.send_snapshot(client)
+        await websocket.accept()
+        client.task = asyncio.create_task(self._writer(client))
+        logger.info(f"Client connected. Total connections: {len(self.clients)}")
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self.wildcard.discard(client)
+        if client.symbols:
+            self.unsubscribe(client, list(client.symbols))
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+        logger.info(f"Client disconnected. Total connections: {len(self.clients)}")
+
+    def broadcast_sync(self, message: dict):
+        """Thread-safe entry point for producers running outside the event loop"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.broadcast, message)
+
+    def subscribe(self, client: ClientConnection, symbols: Iterable[str]) -> List[str]:
+        """Route symbols to a client, subscribing upstream on the first reference"""
+        if client.symbols is None:
+            client.symbols = set()
+            self.wildcard.discard(client)
+
+        added = [symbol for symbol in dict.fromkeys(symbols) if symbol not in client.symbols]
+        for symbol in added:
+            client.symbols.add(symbol)
+            self.routes.setdefault(symbol, set()).add(client)
+        self.acquire_upstream(added)
+        return added
+
+    def acquire_upstream(self, symbols: Iterable[str]):
+        """Take a reference on feed subscriptions, subscribing upstream on the first one"""
+        first_refs = []
+        for symbol in symbols:
+            self.upstream_refs[symbol] = self.upstream_refs.get(symbol, 0) + 1
+            if self.upstream_refs[symbol] == 1 and symbol not in self.pinned:
+                first_refs.append(symbol)
+        if first_refs:
+            self._call_upstream(self._upstream_subscribe, first_refs)
+
+    def release_upstream(self, symbols: Iterable[str]):
+        """Drop references taken by acquire_upstream, unsubscribing upstream on the last one"""
+        last_refs = []
+        for symbol in symbols:
+            if symbol not in self.upstream_refs:
+                continue
+            self.upstream_refs[symbol] -= 1
+            if self.upstream_refs[symbol] == 0:
+                del self.upstream_refs[symbol]
+                if symbol not in self.pinned:
+                    last_refs.append(symbol)
+                    # No more ticks will arrive for it, don't replay a stale price later
+                    self.latest.pop(symbol, None)
+        if last_refs:
+            self._call_upstream(self._upstream_unsubscribe, last_refs)
+
+    def unsubscribe(self, client: ClientConnection, symbols: Iterable[str]) -> List[str]:
+        """Stop routing symbols to a client, unsubscribing upstream on the last reference"""
+        if not client.symbols:
+            return []
+
+        removed = [symbol for symbol in dict.fromkeys(symbols) if symbol in client.symbols]
+        for symbol in removed:
+            client.symbols.discard(symbol)
+            subscribers = self.routes.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.routes[symbol]
+        self.release_upstream(removed)
+        return removed
+
+    def _call_upstream(self, hook: Optional[Callable[[List[str]], None]], symbols: List[str]):
+        # Feed (un)subscribe calls block on the broker socket, keep them off the loop
+        if hook is None:
+            return
+        self._upstream_executor.submit(self._run_upstream, hook, symbols)
+
+    @staticmethod
+    def _run_upstream(hook: Callable[[List[str]], None], symbols: List[str]):
+        try:
+            hook(symbols)
+        except Exception as e:
+            logger.error(f"Error updating feed subscriptions for {symbols}: {str(e)}")
+
+    def handle_client_message(self, websocket: WebSocket, text: str):
+        """Apply a subscribe/unsubscribe/batch request sent by a client and acknowledge it"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+
+        try:
+            request = json.loads(text)
+            action = request.get("action")
+            if action == "batch":
+                interval_ms = request.get("interval_ms")
+                if not isinstance(interval_ms, int) or interval_ms < 0:
+                    raise ValueError("interval_ms must be a non-negative integer")
+                client.set_batch_interval(interval_ms)
+                client.send({"type": "batch_interval", "interval_ms": client.metrics()["batch_ms"]})
+                return
+
+            symbols = request.get("symbols")
+            if action not in ("subscribe", "unsubscribe"):
+                raise ValueError(f"Unknown action: {action}")
+            if not isinstance(symbols, list) or not all(isinstance(symbol, str) for symbol in symbols):
+                raise ValueError("symbols must be a list of strings")
+            if action == "subscribe" and len((client.symbols or set()).union(symbols)) > self.max_symbols:
+                raise ValueError(f"At most {self.max_symbols} symbols per connection")
+        except (ValueError, AttributeError) as e:
+            client.send({"type": "error", "message": str(e)})
+            return
+
+        if action == "subscribe":
+            added = self.subscribe(client, symbols)
+            client.send({"type": "subscribed", "symbols": sorted(client.symbols)})
+            self.send_snapshot(client, added)
+        else:
+            self.unsubscribe(client, symbols)
+            client.send({"type": "unsubscribed", "symbols": sorted(client.symbols or ())})
+
+    def send_snapshot(self, client: ClientConnection, symbols: Optional[Iterable[str]] = None):
+        """Queue one frame with the latest tick of each symbol (every known symbol when None)"""
+        if symbols is None:
+            updates = list(self.latest.values())
+        else:
+            updates = [self.latest[symbol] for symbol in symbols if symbol in self.latest]
+        if not updates:
+            return
+        if client.encoding == "delta":
+            for update in updates:
+                client.versions[update['symbol']] = self.versions[update['symbol']]
+            updates = [self._delta_record(update['symbol'], update) for update in updates]
+        client.send({"type": "snapshot", "updates": updates})
+
+    def _delta_record(self, symbol: str, fields: dict) -> dict:
+        symbol_id = self.symbol_ids.setdefault(symbol, len(self.symbol_ids) + 1)
+        return {"id": symbol_id, **fields}
+
+    def broadcast(self, message: dict):
+        """Encode a message once and queue it for every interested client; must run on the manager's loop"""
+        symbol = message.get('symbol')
+        # Ticks carry no type; typed messages (bars, ...) are routed by symbol but never
+        # conflated, snapshotted or delta encoded
+        is_tick = symbol is not None and 'type' not in message
+        previous = None
+        if symbol is None:
+            targets = list(self.clients.values())
+        else:
+            if is_tick:
+                previous = self.latest.get(symbol)
+                self.latest[symbol] = message
+                version = self.versions[symbol] = self.versions.get(symbol, 0) + 1
+            targets = list(self.routes.get(symbol, ())) + list(self.wildcard)
+        if not targets:
+            return
+
+        # Each form is encoded at most once and the frame shared by every client that takes it
+        frames: Dict[str, str] = {}
+
+        def frame(kind: str) -> str:
+            if kind not in frames:
+                if kind == "full":
+                    frames[kind] = encode_message(self._delta_record(symbol, message))
+                elif kind == "delta":
+                    changed = {key: value for key, value in message.items()
+                               if key != 'symbol' and (previous is None or previous.get(key) != value)}
+                    frames[kind] = encode_message(self._delta_record(symbol, changed))
+                else:
+                    frames[kind] = encode_message(message)
+            return frames[kind]
+
+        for client in targets:
+            if not is_tick:
+                result = client.enqueue(frame("json"))
+            elif client.encoding != "delta":
+                result = client.enqueue(frame("json"), symbol)
+            else:
+                # A delta is only valid on top of the previous tick, and a queued tick it would replace
+                # under conflation may carry fields the client never saw, so fall back to the full record
+                in_sync = client.versions.get(symbol) == version - 1 and ("symbol", symbol) not in client.pending
+                result = client.enqueue(frame("delta" if in_sync else "full"), symbol)
+                if result in ("discarded", "lagging"):
+                    client.versions.pop(symbol, None)
+                else:
+                    client.versions[symbol] = version
+
+            if result == "conflated":
+                self.conflated += 1
+            elif result == "discarded":
+                self.dropped_messages += 1
+            elif result == "lagging":
+                self._drop_lagging(client)
+
+    def _drop_lagging(self, client: ClientConnection):
+        logger.warning(f"Dropping lagging client: {len(client.pending)} messages pending, lag {client.lag():.1f}s")
+        self.dropped_clients += 1
+        self.disconnect(client.websocket)
+        asyncio.ensure_future(self._close(client.websocket, LAGGING_CLOSE_CODE))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Error closing websocket: {e}")
+
+    async def _writer(self, client: ClientConnection):
+        """Drain one client's queue so a slow socket only delays itself"""
+        try:
+            while True:
+                for payload in await client.next_frames():
+                    await client.websocket.send_text(payload)
+                    client.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to client: {e}")
+            self.disconnect(client.websocket)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Totals for the slow-consumer policy plus per-client backlog"""
+        return {
+            "clients": len(self.clients),
+            "conflated": self.conflated,
+            "dropped_messages": self.dropped_messages,
+            "dropped_clients": self.dropped_clients,
+            "connections": [client.metrics() for client in self.clients.values()],
+        }
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from fyers_apiv3 import fyersModel
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout in seconds for every Fyers REST call
+REQUEST_TIMEOUT = (5, 30)
+
+
+class PooledFyersService(fyersModel.FyersServiceSync):
+    """FyersServiceSync that sends every call over one keep-alive requests.Session"""
+
+    def __init__(self, api_logger, request_logger, session: requests.Session, timeout=REQUEST_TIMEOUT):
+        super().__init__(api_logger, request_logger)
+        self.session = session
+        self.timeout = timeout
+
+    def _headers(self, header: str) -> dict:
+        return {"Authorization": header, "Content-Type": self.content, "version": "3"}
+
+    def _error(self, api: str, error: Exception, response=None) -> dict:
+        self.api_logger.error({"API": api, "error": error})
+        return {
+            "s": "error",
+            "code": response.status_code if response is not None else -99,
+            "message": str(error),
+        }
+
+    def get_call(self, api: str, header: str, data=None, data_flag=False) -> dict:
+        base = fyersModel.Config.DATA_API if data_flag else fyersModel.Config.API
+        url = base + api
+        if data is not None:
+            url = url + "?" + urllib.parse.urlencode(data)
+
+        response = None
+        try:
+            response = self.session.get(url, headers=self._headers(header), timeout=self.timeout)
+            self.request_logger.debug({"Status Code": response.status_code, "API": api})
+            # Fyers returns a JSON error body on HTTP errors, hand it back like the SDK does
+            return response.json()
+        except Exception as e:
+            return self._error(api, e, response)
+
+    def _send(self, method: str, api: str, header: str, data) -> dict:
+        response = None
+        try:
+            response = self.session.request(
+                method, fyersModel.Config.API + api, data=json.dumps(data),
+                headers=self._headers(header), timeout=self.timeout,
+            )
+            self.request_logger.debug({"Status Code": response.status_code, "API": api})
+            return response.json()
+        except Exception as e:
+            return self._error(api, e, response)
+
+    def post_call(self, api: str, header: str, data=None) -> dict:
+        return self._send("POST", api, header, data)
+
+    def delete_call(self, api: str, header: str, data) -> dict:
+        return self._send("DELETE", api, header, data)
+
+    def patch_call(self, api: str, header: str, data) -> dict:
+        return self._send("PATCH", api, header, data)
+
+
+class FyersClient:
+    """Shared, token-aware FyersModel backed by a pooled HTTP session"""
+
+    def __init__(self, client_id: str, token_path: Path, log_path: Optional[Path] = None, pool_size: int = 10):
+        self.client_id = client_id
+        self.token_path = Path(token_path)
+        self.log_path = str(log_path) if log_path else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._service: Optional[PooledFyersService] = None
+        self._model: Optional[fyersModel.FyersModel] = None
+        # mtime of the token file when it was last read
+        self._token_mtime: Optional[float] = None
+
+    @property
+    def token(self) -> Optional[str]:
+        model = self._model
+        return model.token if model else None
+
+    def get(self) -> fyersModel.FyersModel:
+        """
+        Current FyersModel. The token file is re-read whenever its mtime changes, so a
+        refresh by another process (or a new day's login) is picked up without a restart.
+        """
+        try:
+            mtime = os.stat(self.token_path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        model = self._model
+        if model is not None and (mtime is None or mtime == self._token_mtime):
+            return model
+
+        with self._lock:
+            if mtime is None:
+                if self._model is None:
+                    raise FileNotFoundError(f"Access token file not found: {self.token_path}")
+            elif mtime != self._token_mtime:
+                token = self.token_path.read_text().strip()
+                self._token_mtime = mtime
+                if token and (self._model is None or token != self._model.token):
+                    self._model = self._build(token)
+                    logger.info("Fyers client token loaded from disk")
+            if self._model is None:
+                raise ValueError(f"Access token file is empty: {self.token_path}")
+            return self._model
+
+    def set_token(self, token: str):
+        """Swap in a refreshed access token; in-flight calls keep using the old model"""
+        if not token or token == self.token:
+            return
+        with self._lock:
+            self._model = self._build(token)
+        logger.info("Fyers client token updated")
+
+    def _build(self, token: str) -> fyersModel.FyersModel:
+        model = fyersModel.FyersModel(
+            client_id=self.client_id, is_async=False, token=token, log_path=self.log_path
+        )
+        # Share one service (and its connection pool) across token swaps
+        if self._service is None:
+            self._service = PooledFyersService(model.api_logger, model.request_logger, self.session)
+        model.service = self._service
+        return model
@@ -0,0 +1,115 @@
+"""
+Vectorised Black-Scholes pricing, implied volatility and Greeks.
+
+Every function takes NumPy arrays (or scalars that broadcast) so a whole option chain
+is priced in one pass. European options on an index, no dividends.
+"""
+import numpy as np
+
+# Annual risk-free rate used for Indian index options
+RISK_FREE_RATE = 0.065
+DAYS_PER_YEAR = 365.0
+# Implied volatility search bounds and stopping rule
+MIN_VOL = 1e-4
+MAX_VOL = 5.0
+IV_TOLERANCE = 1e-6
+IV_MAX_ITERATIONS = 100
+
+_SQRT_2PI = np.sqrt(2 * np.pi)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """Standard normal CDF via the Abramowitz-Stegun 7.1.26 erf approximation (abs error < 1.5e-7)"""
+    z = np.abs(x) / np.sqrt(2)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.sign(x) * erf)
+
+
+def _d1_d2(spot, strike, years, rate, vol):
+    sqrt_t = np.sqrt(years)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * years) / (vol * sqrt_t)
+    return d1, d1 - vol * sqrt_t
+
+
+def bs_price(spot, strike, years, rate, vol, is_call) -> np.ndarray:
+    """Black-Scholes price; is_call is a boolean array selecting calls over puts"""
+    d1, d2 = _d1_d2(spot, strike, years, rate, vol)
+    discount = strike * np.exp(-rate * years)
+    call = spot * norm_cdf(d1) - discount * norm_cdf(d2)
+    put = discount * norm_cdf(-d2) - spot * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def implied_volatility(price, spot, strike, years, rate, is_call,
+                       tol: float = IV_TOLERANCE, max_iter: int = IV_MAX_ITERATIONS) -> np.ndarray:
+    """
+    Solve for volatility across all contracts at once.
+
+    Newton steps on vega, safeguarded by a per-contract bisection bracket: a step that
+    leaves the bracket (or a vanishing vega) falls back to the bracket midpoint. Prices
+    outside the no-arbitrage bounds, or missing, give NaN.
+    """
+    price, spot, strike, years, is_call = np.broadcast_arrays(
+        np.asarray(price, dtype=float), np.asarray(spot, dtype=float), np.asarray(strike, dtype=float),
+        np.asarray(years, dtype=float), np.asarray(is_call, dtype=bool),
+    )
+    discount = strike * np.exp(-rate * years)
+    lower = np.where(is_call, np.maximum(spot - discount, 0.0), np.maximum(discount - spot, 0.0))
+    upper = np.where(is_call, spot, discount)
+    valid = np.isfinite(price) & (price > lower) & (price < upper) & (years > 0)
+
+    vol = np.full(price.shape, np.nan)
+    if not valid.any():
+        return vol
+    target, s, k, t, calls = price[valid], spot[valid], strike[valid], years[valid], is_call[valid]
+
+    low = np.full(target.shape, MIN_VOL)
+    high = np.full(target.shape, MAX_VOL)
+    sigma = np.full(target.shape, 0.2)
+    active = np.ones(target.shape, dtype=bool)
+    for _ in range(max_iter):
+        diff = bs_price(s, k, t, rate, sigma, calls) - target
+        active = np.abs(diff) > tol
+        if not active.any():
+            break
+        high = np.where(diff > 0, sigma, high)
+        low = np.where(diff < 0, sigma, low)
+        d1, _ = _d1_d2(s, k, t, rate, sigma)
+        vega = s * norm_pdf(d1) * np.sqrt(t)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = sigma - diff / vega
+        bisect = 0.5 * (low + high)
+        step = np.where((vega > 1e-12) & (newton > low) & (newton < high), newton, bisect)
+        sigma = np.where(active, step, sigma)
+
+    vol[valid] = np.where(active, np.nan, sigma)
+    return vol
+
+
+def greeks(spot, strike, years, rate, vol, is_call) -> dict:
+    """
+    Delta, gamma, theta and vega. Theta is per calendar day and vega per one
+    volatility point (1%), the way option chains quote them.
+    """
+    d1, d2 = _d1_d2(spot, strike, years, rate, vol)
+    sqrt_t = np.sqrt(years)
+    pdf = norm_pdf(d1)
+    discount = strike * np.exp(-rate * years)
+
+    delta = np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1.0)
+    gamma = pdf / (spot * vol * sqrt_t)
+    decay = -spot * pdf * vol / (2 * sqrt_t)
+    theta = np.where(is_call, decay - rate * discount * norm_cdf(d2), decay + rate * discount * norm_cdf(-d2))
+    vega = spot * pdf * sqrt_t
+    return {
+        "delta": delta,
+        "gamma": gamma,
+        "theta": theta / DAYS_PER_YEAR,
+        "vega": vega / 100,
+    }
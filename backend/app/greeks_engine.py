@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from greeks import RISK_FREE_RATE, greeks, implied_volatility
+from instrument_master import InstrumentMaster
+
+logger = logging.getLogger(__name__)
+
+# Live Greeks are published as ticks for GREEKS:<option symbol>
+GREEKS_PREFIX = "GREEKS:"
+# Recompute a contract once its price moves more than this (absolute, in rupees) ...
+PRICE_TOLERANCE = 0.05
+# ... or its underlying moves more than this fraction since the chain was last recomputed
+SPOT_TOLERANCE = 0.0005
+
+
+def is_greeks_symbol(symbol: str) -> bool:
+    return symbol.startswith(GREEKS_PREFIX)
+
+
+class ContractState:
+    """Inputs last used for one option and the Greeks they gave"""
+
+    __slots__ = ("symbol", "index", "expiry", "strike", "is_call", "price", "timestamp",
+                 "price_used", "spot_used", "values")
+
+    def __init__(self, symbol: str, index: str, expiry: pd.Timestamp, strike: float, is_call: bool):
+        self.symbol = symbol
+        self.index = index
+        self.expiry = expiry
+        self.strike = strike
+        self.is_call = is_call
+        self.price: Optional[float] = None
+        self.timestamp = 0
+        self.price_used: Optional[float] = None
+        self.spot_used: Optional[float] = None
+        self.values: Dict[str, Optional[float]] = {}
+
+
+class GreeksEngine:
+    """
+    Keeps IV and Greeks current for every option that ticks, recomputing only what moved.
+
+    on_tick() runs on the feed thread and only marks contracts dirty: an option whose price
+    moved past PRICE_TOLERANCE, or every contract on an index whose spot moved past
+    SPOT_TOLERANCE. The first dirty mark schedules one flush on the event loop, which solves
+    all dirty contracts in a single vectorised pass and hands the updates to `publish`.
+    """
+
+    def __init__(self, instrument_master: InstrumentMaster, index_symbols: Dict[str, str],
+                 publish: Callable[[List[Dict]], None], price_tolerance: float = PRICE_TOLERANCE,
+                 spot_tolerance: float = SPOT_TOLERANCE, rate: float = RISK_FREE_RATE):
+        self.instrument_master = instrument_master
+        # Fyers index symbol -> index name used in the master
+        self.indexes = {symbol: index for index, symbol in index_symbols.items()}
+        self.publish = publish
+        self.price_tolerance = price_tolerance
+        self.spot_tolerance = spot_tolerance
+        self.rate = rate
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._contracts: Dict[str, Optional[ContractState]] = {}
+        self._misses_version = 0
+        self._by_index: Dict[str, Set[ContractState]] = {}
+        self._spot: Dict[str, float] = {}
+        # Spot the index's contracts were last marked dirty at
+        self._spot_marked: Dict[str, float] = {}
+        self._dirty: Set[ContractState] = set()
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.recomputed = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    def on_tick(self, tick: Dict):
+        """Mark contracts affected by a tick; safe to call from any thread"""
+        symbol = tick['symbol']
+        price = tick.get('ltp')
+        if not price:
+            return
+
+        with self._lock:
+            index = self.indexes.get(symbol)
+            if index is not None:
+                self._spot[index] = price
+                marked = self._spot_marked.get(index)
+                if marked is None or abs(price - marked) > marked * self.spot_tolerance:
+                    self._spot_marked[index] = price
+                    self._dirty.update(self._by_index.get(index, ()))
+            else:
+                contract = self._contract(symbol)
+                if contract is None:
+                    return
+                contract.price = price
+                contract.timestamp = int(tick.get('timestamp', 0))
+                if contract.price_used is None or abs(price - contract.price_used) > self.price_tolerance:
+                    self._dirty.add(contract)
+
+            if self._dirty and not self._scheduled and self.loop is not None and not self.loop.is_closed():
+                self._scheduled = True
+                self.loop.call_soon_threadsafe(self.flush)
+
+    def _contract(self, symbol: str) -> Optional[ContractState]:
+        # Looked up in the master once per symbol; None marks symbols that are not options,
+        # forgotten whenever the master reloads since a new day's master lists new contracts
+        contract = self._contracts.get(symbol)
+        if contract is not None:
+            return contract
+        try:
+            self.instrument_master.refresh()
+            if self.instrument_master.version != self._misses_version:
+                self._misses_version = self.instrument_master.version
+                self._contracts = {key: value for key, value in self._contracts.items() if value is not None}
+            if symbol in self._contracts:
+                return None
+            described = self.instrument_master.describe(symbol)
+        except FileNotFoundError:
+            return None
+        contract = None
+        if described is not None:
+            index, expiry, strike, option_type = described
+            contract = ContractState(symbol, index, expiry, strike, option_type == "CE")
+            self._by_index.setdefault(index, set()).add(contract)
+        self._contracts[symbol] = contract
+        return contract
+
+    def flush(self, now: Optional[pd.Timestamp] = None) -> List[Dict]:
+        """Recompute every dirty contract in one batch and publish the results; `now` is naive UTC"""
+        with self._lock:
+            self._scheduled = False
+            ready = [contract for contract in self._dirty
+                     if contract.price is not None and contract.index in self._spot]
+            # Contracts without a spot yet are marked again by the index's first tick
+            self._dirty.clear()
+            if not ready:
+                return []
+            spots = np.array([self._spot[contract.index] for contract in ready])
+            prices = np.array([contract.price for contract in ready])
+            for contract, spot, price in zip(ready, spots, prices):
+                contract.spot_used = spot
+                contract.price_used = price
+
+        now = now if now is not None else self.instrument_master.utc_now()
+        strikes = np.array([contract.strike for contract in ready])
+        is_call = np.array([contract.is_call for contract in ready])
+        years = np.array([self.instrument_master.years_to_expiry(contract.expiry, now) for contract in ready])
+
+        iv = implied_volatility(prices, spots, strikes, years, self.rate, is_call)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            results = greeks(spots, strikes, years, self.rate, iv, is_call)
+        results["iv"] = iv * 100
+
+        updates = []
+        for i, contract in enumerate(ready):
+            values = {name: (None if np.isnan(column[i]) else round(float(column[i]), 6))
+                      for name, column in results.items()}
+            contract.values = values
+            updates.append({
+                'symbol': GREEKS_PREFIX + contract.symbol,
+                'timestamp': contract.timestamp,
+                'index': contract.index,
+                'expiry': f"{contract.expiry:%Y-%m-%d}",
+                'strike': contract.strike,
+                'option_type': "CE" if contract.is_call else "PE",
+                'ltp': float(prices[i]),
+                'spot': float(spots[i]),
+                'iv': values["iv"],
+                'delta': values["delta"],
+                'gamma': values["gamma"],
+                'theta': values["theta"],
+                'vega': values["vega"],
+            })
+
+        self.flushes += 1
+        self.recomputed += len(updates)
+        try:
+            self.publish(updates)
+        except Exception as e:
+            logger.error(f"Error publishing Greeks: {str(e)}")
+        return updates
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            tracked = sum(1 for contract in self._contracts.values() if contract is not None)
+        return {"contracts": tracked, "flushes": self.flushes, "recomputed": self.recomputed}
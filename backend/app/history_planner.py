@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, List, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+
+# Longest window Fyers serves in one history request, in days, by resolution
+MAX_DAYS_PER_REQUEST = {
+    "D": 366,
+    "1D": 366,
+}
+DEFAULT_MAX_DAYS = 100  # intraday resolutions
+
+
+def plan_ranges(range_from: int, range_to: int, resolution: str = "1") -> List[Tuple[int, int]]:
+    """Split [range_from, range_to] (epoch seconds, inclusive) into windows Fyers accepts"""
+    span = MAX_DAYS_PER_REQUEST.get(resolution, DEFAULT_MAX_DAYS) * DAY_SECONDS
+    ranges = []
+    start = range_from
+    while start <= range_to:
+        end = min(start + span - 1, range_to)
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_ranges(fetch: Callable[[int, int], pd.DataFrame], ranges: List[Tuple[int, int]],
+                 executor: Executor, limiter: RateLimiter) -> pd.DataFrame:
+    """Run fetch over every window concurrently under the rate limiter and stitch the candles"""
+    def limited(window: Tuple[int, int]) -> pd.DataFrame:
+        limiter.acquire()
+        return fetch(*window)
+
+    if len(ranges) == 1:
+        frames = [limited(ranges[0])]
+    else:
+        frames = list(executor.map(limited, ranges))
+
+    non_empty = [frame for frame in frames if not frame.empty]
+    if not non_empty:
+        return frames[0]
+    # Fyers may return a bar on a window boundary in both neighbouring windows
+    return (pd.concat(non_empty, ignore_index=True)
+            .drop_duplicates("timestamp", keep="last")
+            .sort_values("timestamp")
+            .reset_index(drop=True))
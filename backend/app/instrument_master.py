@@ -0,0 +1,479 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+OPTION_TYPES = ("CE", "PE")
+
+# Expiries are stored as naive UTC (the master's epoch seconds); trading dates are IST
+EXPIRY_TZ = "Asia/Kolkata"
+YEAR_SECONDS = 365 * 86400
+# Floor on time to expiry so an option at or past expiry still prices
+MIN_EXPIRY_SECONDS = 60
+
+# Underlyings and fields kept from the Fyers symbol masters
+MASTER_UNDERLYINGS = ('NIFTY', 'BANKNIFTY', 'MIDCPNIFTY', 'FINNIFTY', 'SENSEX', 'BANKEX')
+MASTER_COLUMNS = ['symbol', 'exSymbol', 'segment', 'exchange', 'expiryDate', 'strikePrice', 'exSymName']
+
+# Bump when the snapshot schema changes so old files are rebuilt
+SNAPSHOT_VERSION = "1"
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("symbol", pa.string()),
+    ("exSymbol", pa.dictionary(pa.int8(), pa.string())),
+    ("segment", pa.int16()),
+    ("exchange", pa.int16()),
+    ("expiryDate", pa.timestamp("s")),
+    ("strikePrice", pa.int32()),
+    ("exSymName", pa.string()),
+])
+
+
+def snapshot_path_for(csv_path: Path) -> Path:
+    """Location of the columnar snapshot that accompanies a master CSV"""
+    return Path(csv_path).with_suffix(".arrow")
+
+
+def source_fingerprint(path: Path) -> str:
+    """SHA-256 of the master CSV, used to stamp and validate snapshots"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def master_table(df: pd.DataFrame) -> pa.Table:
+    """Convert a master frame to the typed snapshot schema"""
+    frame = pd.DataFrame({
+        "symbol": df['symbol'].astype(str),
+        "exSymbol": df['exSymbol'].astype('category'),
+        "segment": df['segment'].astype('int16'),
+        "exchange": df['exchange'].astype('int16'),
+        "expiryDate": pd.to_datetime(df['expiryDate']).astype('datetime64[s]'),
+        "strikePrice": pd.to_numeric(df['strikePrice']).astype('int32'),
+        "exSymName": df['exSymName'].astype(str),
+    })
+    return pa.Table.from_pandas(frame, schema=SNAPSHOT_SCHEMA, preserve_index=False)
+
+
+def write_master_snapshot(df: pd.DataFrame, path: Path, source_hash: str):
+    """Write a typed Arrow IPC snapshot of the master frame, stamped with its source hash"""
+    table = master_table(df).replace_schema_metadata({
+        "snapshot_version": SNAPSHOT_VERSION,
+        "source_sha256": source_hash,
+    })
+
+    # Write to a uniquely named temp file first so readers never map a partial snapshot,
+    # and the backend and the downloader never write into each other's file
+    path = Path(path)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.stem}.", suffix=".arrow.tmp",
+                                     delete=False) as sink:
+        tmp_path = Path(sink.name)
+        try:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except BaseException:
+            sink.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+    os.replace(tmp_path, path)
+    logger.info(f"Instrument master snapshot saved to {path}")
+
+
+def read_master_table(path: Path, source_hash: Optional[str] = None) -> Optional[pa.Table]:
+    """
+    Memory-map a snapshot as an Arrow table whose columns point into the mapped file.
+    Returns None if it is missing, from another version or stale.
+    """
+    if not Path(path).exists():
+        return None
+
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"snapshot_version", b"").decode() != SNAPSHOT_VERSION:
+        logger.info(f"Instrument master snapshot {path} has an old version, ignoring it")
+        return None
+    if source_hash is not None and metadata.get(b"source_sha256", b"").decode() != source_hash:
+        logger.info(f"Instrument master snapshot {path} is stale, ignoring it")
+        return None
+    return table
+
+
+def read_master_snapshot(path: Path, source_hash: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """A snapshot as a pandas frame (a full copy); None if it is missing, from another version or stale"""
+    table = read_master_table(path, source_hash)
+    return table.to_pandas() if table is not None else None
+
+
+def iter_json_object_items(chunks: Iterable[bytes]) -> Iterator[Tuple[str, Any]]:
+    """Incrementally parse a top-level JSON object, yielding (key, value) pairs as they complete"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    exhausted = False
+    state = "start"
+
+    def fill() -> bool:
+        nonlocal buf, pos, exhausted
+        if exhausted:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        return True
+
+    def decode():
+        # A value that ends exactly at the buffer edge may still be truncated (e.g. numbers)
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if end < len(buf) or exhausted:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+            fill()
+
+    key = None
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos >= len(buf):
+            if not fill():
+                raise ValueError("Unexpected end of JSON stream")
+            continue
+
+        char = buf[pos]
+        if state == "start":
+            if char != "{":
+                raise ValueError("Expected a JSON object")
+            pos += 1
+            state = "key"
+        elif state == "key":
+            if char == "}":
+                return
+            key = decode()
+            state = "colon"
+        elif state == "colon":
+            if char != ":":
+                raise ValueError(f"Expected ':' after key {key!r}")
+            pos += 1
+            yield key, decode()
+            state = "separator"
+        elif state == "separator":
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' after value of {key!r}")
+            pos += 1
+            state = "key"
+
+
+def iter_master_rows(chunks: Iterable[bytes], underlyings=MASTER_UNDERLYINGS) -> Iterator[List[Any]]:
+    """Stream a Fyers symbol master, yielding only the kept columns of the wanted underlyings"""
+    wanted = set(underlyings)
+    for symbol, record in iter_json_object_items(chunks):
+        if isinstance(record, dict) and record.get('exSymbol') in wanted:
+            yield [symbol] + [record.get(column) for column in MASTER_COLUMNS[1:]]
+
+
+# Option contracts are keyed by one int64: exSymbol code (7 bits, the snapshot's int8
+# dictionary), expiry epoch seconds (32), strike (23) and a call flag (1), high to low
+_EPOCH_BITS = 32
+_STRIKE_BITS = 23
+_EPOCH_MASK = (1 << _EPOCH_BITS) - 1
+_STRIKE_MASK = (1 << _STRIKE_BITS) - 1
+
+
+def _pack_contract(code, epoch, strike, is_call):
+    """Contract key from scalars or int64 arrays"""
+    return ((code << _EPOCH_BITS | epoch) << _STRIKE_BITS | strike) << 1 | is_call
+
+
+def diff_masters(previous: pd.DataFrame, current: pd.DataFrame) -> Dict[str, List[str]]:
+    """Compare two master frames by symbol and report added, expired and changed contracts"""
+    def normalise(df: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame({
+            'symbol': df['symbol'].astype(str),
+            'exSymbol': df['exSymbol'].astype(str),
+            'expiryDate': pd.to_datetime(df['expiryDate']).astype('datetime64[s]'),
+            'strikePrice': pd.to_numeric(df['strikePrice']).astype(float),
+            'exSymName': df['exSymName'].astype(str),
+        }).drop_duplicates('symbol').set_index('symbol')
+
+    before = normalise(previous)
+    after = normalise(current)
+
+    common = before.index.intersection(after.index)
+    differs = (before.loc[common] != after.loc[common]).any(axis=1)
+
+    return {
+        "added": sorted(after.index.difference(before.index)),
+        "expired": sorted(before.index.difference(after.index)),
+        "changed": sorted(common[differs.to_numpy()]),
+    }
+
+
+class _MasterIndex:
+    """One load of the master's option lookup tables, published as a whole"""
+
+    __slots__ = ("version", "codes", "names", "keys", "symbols", "by_symbol", "expiries", "strikes", "all_strikes")
+
+    def __init__(self, version: int = 0, names: Optional[List[str]] = None,
+                 keys: Optional[np.ndarray] = None, symbols: Optional[pa.Array] = None,
+                 expiries: Optional[Dict[str, List[pd.Timestamp]]] = None,
+                 strikes: Optional[Dict[Tuple[int, int], np.ndarray]] = None,
+                 all_strikes: Optional[Dict[str, np.ndarray]] = None):
+        self.version = version
+        # exSymbol <-> its dictionary code in the snapshot
+        self.names = names or []
+        self.codes = {name: code for code, name in enumerate(self.names)}
+        # Sorted packed contract keys (see _pack_contract) and their symbols, searched by bisection
+        self.keys = keys if keys is not None else np.empty(0, dtype=np.int64)
+        self.symbols = symbols if symbols is not None else pa.array([], pa.string())
+        # symbol -> packed key, built on the first describe() against this index
+        self.by_symbol: Optional[Dict[str, int]] = None
+        # exSymbol -> sorted expiries that have listed options
+        self.expiries = expiries or {}
+        # (code, expiry epoch seconds) -> sorted strikes
+        self.strikes = strikes or {}
+        # exSymbol -> sorted strikes across all expiries
+        self.all_strikes = all_strikes or {}
+
+    def symbol(self, key: Optional[int]) -> Optional[str]:
+        if key is None:
+            return None
+        pos = int(np.searchsorted(self.keys, key))
+        if pos < self.keys.size and self.keys[pos] == key:
+            return self.symbols[pos].as_py()
+        return None
+
+    def series_key(self, ex_symbol: str, expiry: Any) -> Optional[Tuple[int, int]]:
+        code = self.codes.get(ex_symbol)
+        if code is None:
+            return None
+        return code, pd.Timestamp(expiry).value // 10**9
+
+    def contract_key(self, ex_symbol: str, expiry: Any, strike: float, option_type: str) -> Optional[int]:
+        series = self.series_key(ex_symbol, expiry)
+        strike = float(strike)
+        if series is None or option_type not in OPTION_TYPES or not strike.is_integer():
+            return None
+        code, epoch = series
+        if not (0 <= strike <= _STRIKE_MASK and 0 <= epoch <= _EPOCH_MASK):
+            return None
+        return _pack_contract(code, epoch, int(strike), int(option_type == "CE"))
+
+
+class InstrumentMaster:
+    """In-memory view of master_file.csv, reloaded only when the file changes"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.snapshot_path = snapshot_path_for(self.path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        # Every lookup reads this one reference, so a reload is seen all at once
+        self._index = _MasterIndex()
+
+    @property
+    def version(self) -> int:
+        """Bumped on every reload, so callers can tell their cached lookups are stale"""
+        return self._index.version
+
+    def refresh(self) -> bool:
+        """Reload the index if the master file changed. Returns True on reload."""
+        # Fall back to the snapshot alone when the CSV is not around
+        watched = self.path if self.path.exists() else self.snapshot_path
+        mtime = os.stat(watched).st_mtime
+        if mtime == self._mtime:
+            return False
+
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            self._index = self._build(self._load_table(), self._index.version + 1)
+            self._mtime = mtime
+            logger.info(f"Instrument master loaded from {self.path}: {self._index.keys.size} option contracts")
+            return True
+
+    def _load_table(self) -> pa.Table:
+        """Load the master from its snapshot, rebuilding the snapshot if it is stale"""
+        if not self.path.exists():
+            table = read_master_table(self.snapshot_path)
+            if table is None:
+                raise FileNotFoundError(
+                    f"Master file {self.path} not found and snapshot {self.snapshot_path} is unusable")
+            return table
+
+        source_hash = source_fingerprint(self.path)
+        table = read_master_table(self.snapshot_path, source_hash)
+        if table is not None:
+            return table
+
+        df = pd.read_csv(self.path)
+        try:
+            write_master_snapshot(df, self.snapshot_path, source_hash)
+            table = read_master_table(self.snapshot_path, source_hash)
+        except Exception as e:
+            logger.error(f"Error writing instrument master snapshot: {str(e)}")
+        return table if table is not None else master_table(df)
+
+    @staticmethod
+    def _build(table: pa.Table, version: int) -> _MasterIndex:
+        """
+        Precompute the option lookup tables from the snapshot's Arrow columns: exSymbol
+        dictionary codes, int32 strikes and epoch-second expiries as NumPy arrays, packed
+        into int64 contract keys, so no per-row pandas objects are made.
+        """
+        option_type = pc.utf8_slice_codeunits(table.column('symbol'), -2)
+        is_call = pc.equal(option_type, "CE")
+        keep = pc.and_(pc.or_(is_call, pc.equal(option_type, "PE")),
+                       pc.and_(pc.is_valid(table.column('strikePrice')), pc.is_valid(table.column('expiryDate'))))
+        options = table.filter(keep).unify_dictionaries()
+
+        ex_symbol = options.column('exSymbol').combine_chunks()
+        names = ex_symbol.dictionary.to_pylist()
+        codes = ex_symbol.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+        epochs = options.column('expiryDate').combine_chunks().cast(pa.int64()).to_numpy()
+        strikes = options.column('strikePrice').combine_chunks().to_numpy().astype(np.int64)
+        calls = pc.filter(is_call, keep).to_numpy(zero_copy_only=False).astype(np.int64)
+        symbols = options.column('symbol')
+
+        packable = (strikes >= 0) & (strikes <= _STRIKE_MASK) & (epochs >= 0) & (epochs <= _EPOCH_MASK)
+        if not packable.all():
+            logger.warning(f"Skipping {int((~packable).sum())} option contracts with out-of-range strikes or expiries")
+            codes, epochs, strikes, calls = codes[packable], epochs[packable], strikes[packable], calls[packable]
+            symbols = symbols.filter(pa.array(packable))
+        keys = _pack_contract(codes, epochs, strikes, calls)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        symbols = symbols.take(pa.array(order)).combine_chunks()
+
+        # Sorted distinct (code, expiry, strike); each run of one (code, expiry) is a strike list
+        listed = keys >> 1
+        listed = listed[np.diff(listed, prepend=-1) != 0]
+        series = listed >> _STRIKE_BITS
+        listed_strikes = (listed & _STRIKE_MASK).astype(float)
+        starts = np.flatnonzero(np.diff(series, prepend=-1))
+        ends = np.append(starts[1:], listed.size)
+
+        strike_lists = {}
+        expiries: Dict[str, List[pd.Timestamp]] = {}
+        for begin, end, key in zip(starts.tolist(), ends.tolist(), series[starts].tolist()):
+            code, epoch = key >> _EPOCH_BITS, key & _EPOCH_MASK
+            strike_lists[(code, epoch)] = listed_strikes[begin:end]
+            expiries.setdefault(names[code], []).append(pd.Timestamp(epoch, unit='s'))
+        series_codes = series >> _EPOCH_BITS
+        all_strikes = {names[code]: np.unique(listed_strikes[series_codes == code])
+                       for code in np.unique(series_codes).tolist()}
+
+        return _MasterIndex(version, names, keys, symbols, expiries, strike_lists, all_strikes)
+
+    def expiries(self, ex_symbol: str) -> List[pd.Timestamp]:
+        """Sorted option expiries for an underlying"""
+        self.refresh()
+        return self._index.expiries.get(ex_symbol, [])
+
+    def strikes(self, ex_symbol: str, expiry: Optional[pd.Timestamp] = None) -> np.ndarray:
+        """Sorted strikes for an underlying, optionally restricted to one expiry"""
+        self.refresh()
+        index = self._index
+        if expiry is None:
+            return index.all_strikes.get(ex_symbol, np.empty(0))
+        return index.strikes.get(index.series_key(ex_symbol, expiry), np.empty(0))
+
+    def nearest_strikes(self, ex_symbol: str, price: float, width: int = 5,
+                        expiry: Optional[pd.Timestamp] = None) -> Tuple[np.ndarray, Optional[float]]:
+        """`width` strikes either side of the one nearest `price`, and that strike, by binary search"""
+        strikes = self.strikes(ex_symbol, expiry)
+        if strikes.size == 0:
+            return strikes, None
+        pos = int(np.searchsorted(strikes, price))
+        # searchsorted gives the first strike >= price; step back when the one below is nearer (ties go down)
+        if pos == strikes.size or (pos > 0 and price - strikes[pos - 1] <= strikes[pos] - price):
+            pos -= 1
+        return strikes[max(0, pos - width):pos + width + 1], float(strikes[pos])
+
+    def contract(self, ex_symbol: str, expiry: pd.Timestamp, strike: float, option_type: str) -> Optional[str]:
+        """Resolve a single option contract to its Fyers symbol"""
+        self.refresh()
+        index = self._index
+        return index.symbol(index.contract_key(ex_symbol, expiry, strike, option_type))
+
+    @staticmethod
+    def utc_now() -> pd.Timestamp:
+        """Current time as naive UTC, comparable with listed expiries"""
+        return pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+    @staticmethod
+    def years_to_expiry(expiry: pd.Timestamp, now: Optional[pd.Timestamp] = None) -> float:
+        """Time left to a listed expiry in years, floored at MIN_EXPIRY_SECONDS"""
+        now = now if now is not None else InstrumentMaster.utc_now()
+        return max((expiry - now).total_seconds(), MIN_EXPIRY_SECONDS) / YEAR_SECONDS
+
+    def resolve_expiry(self, ex_symbol: str, expiry: Optional[Any] = None,
+                       now: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+        """
+        The listed expiry falling on an IST trading date (e.g. "2025-01-16"), or, when no
+        date is given, the nearest one not yet expired. Raises ValueError for a bad date.
+        """
+        expiries = self.expiries(ex_symbol)
+        if expiry is not None:
+            day = pd.Timestamp(expiry).normalize()
+            return next((candidate for candidate in expiries
+                         if candidate.tz_localize("UTC").tz_convert(EXPIRY_TZ).tz_localize(None).normalize() == day),
+                        None)
+        now = now if now is not None else self.utc_now()
+        return next((candidate for candidate in expiries if candidate > now), None)
+
+    def describe(self, symbol: str) -> Optional[Tuple[str, pd.Timestamp, float, str]]:
+        """(exSymbol, expiry, strike, option_type) for an option's Fyers symbol"""
+        self.refresh()
+        index = self._index
+        by_symbol = index.by_symbol
+        if by_symbol is None:
+            # Built once per index; a racing builder only repeats the work
+            by_symbol = index.by_symbol = dict(zip(index.symbols.to_pylist(), index.keys.tolist()))
+        key = by_symbol.get(symbol)
+        if key is None:
+            return None
+        is_call, strike = key & 1, (key >> 1) & _STRIKE_MASK
+        code, epoch = key >> (1 + _STRIKE_BITS + _EPOCH_BITS), (key >> (1 + _STRIKE_BITS)) & _EPOCH_MASK
+        return index.names[code], pd.Timestamp(epoch, unit='s'), float(strike), "CE" if is_call else "PE"
+
+    def straddle(self, ex_symbol: str, strike: float,
+                 expiry: Optional[pd.Timestamp] = None) -> Optional[Tuple[pd.Timestamp, str, str]]:
+        """Return (expiry, CE symbol, PE symbol) for the nearest expiry listing both legs"""
+        self.refresh()
+        index = self._index
+        candidates = [pd.Timestamp(expiry)] if expiry is not None else index.expiries.get(ex_symbol, [])
+        for candidate in candidates:
+            ce_symbol = index.symbol(index.contract_key(ex_symbol, candidate, strike, "CE"))
+            pe_symbol = index.symbol(index.contract_key(ex_symbol, candidate, strike, "PE"))
+            if ce_symbol and pe_symbol:
+                return candidate, ce_symbol, pe_symbol
+        return None
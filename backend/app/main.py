@@ -1,9 +1,9 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Header, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import pandas as pd
 from pathlib import Path
 import logging
-import os
 import sys
 import json
 import time
@@ -11,14 +11,26 @@ from datetime import datetime, timedelta
 import pytz
 import numpy as np
 from typing import Dict, Optional, List, Any
+import pyarrow as pa
 import pyarrow.parquet as pq
-from fyers_apiv3 import fyersModel
 from fyers_apiv3.FyersWebsocket import data_ws
-from Fyers_login import ensure_valid_token, CLIENT_ID
+from Fyers_login import ensure_valid_token, on_token_refresh, CLIENT_ID
+from fyers_client import FyersClient
+from instrument_master import InstrumentMaster
+from connection_manager import ConnectionManager, SlowConsumerPolicy, ENCODINGS as WS_ENCODINGS
+from tick_journal import TickJournal
+from tick_store import TickStore
+from bar_builder import BarBuilder, BAR_INTERVALS
+from straddle_engine import StraddleEngine, is_straddle_symbol
+from greeks import RISK_FREE_RATE, greeks, implied_volatility
+from greeks_engine import GreeksEngine, is_greeks_symbol
+from quote_service import QuoteService
+from candle_store import CandleStore, CANDLE_COLUMNS
+from history_planner import RateLimiter, fetch_ranges, plan_ranges
+from straddle_series import build_straddle_series
 from contextlib import asynccontextmanager
 import asyncio
-from queue import Queue
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 
 # Configure logging
@@ -29,9 +41,8 @@ logger = logging.getLogger(__name__)
 DATA_DIR = Path(__file__).parent.parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
-# Create cache directory for parquet files
-CACHE_DIR = DATA_DIR / "cache"
-CACHE_DIR.mkdir(exist_ok=True)
+# Append-only journal of every tick received from the feed
+tick_journal = TickJournal(DATA_DIR / "ticks")
 
 # Constants
 INDEX_SYMBOLS = {
@@ -43,72 +54,64 @@ INDEX_SYMBOLS = {
     "BANKEX": "BSE:BANKEX-INDEX"
 }
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self._lock = asyncio.Lock()
-        self.message_queue = Queue()
-        self.broadcast_thread = threading.Thread(target=self._process_queue, daemon=True)
-        self.broadcast_thread.start()
+# Legs returned by the historical straddle endpoint
+LEG_KEYS = ("ce_data", "pe_data", "spot_data")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
 
-    def _process_queue(self):
-        """Process messages from the queue in a separate thread"""
-        while True:
-            try:
-                message = self.message_queue.get()
-                if message is None:  # Shutdown signal
-                    break
-                
-                # Get the running event loop or create a new one
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                
-                # Run the broadcast in the event loop
-                loop.run_until_complete(self.broadcast(message))
-                
-            except Exception as e:
-                logger.error(f"Error processing message from queue: {e}")
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        async with self._lock:
-            self.active_connections.append(websocket)
-        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
-
-    def broadcast_sync(self, message: dict):
-        """Add message to queue for broadcasting"""
-        self.message_queue.put(message)
-
-    async def broadcast(self, message: dict):
-        """Asynchronous broadcast to all connected clients"""
-        async with self._lock:
-            disconnected = []
-            for connection in self.active_connections:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to client: {e}")
-                    disconnected.append(connection)
-            
-            # Clean up disconnected clients
-            for connection in disconnected:
-                try:
-                    self.active_connections.remove(connection)
-                except ValueError:
-                    pass  # Connection already removed
+# Option contracts indexed once from master_file.csv
+instrument_master = InstrumentMaster(DATA_DIR / "master_file.csv")
+
+# Shared REST client, re-tokened whenever ensure_valid_token refreshes the token
+fyers_client = FyersClient(CLIENT_ID, DATA_DIR / "access_token.txt", log_path=DATA_DIR)
+on_token_refresh(fyers_client.set_token)
+
+# Append-only 1-minute candles so repeated history requests only fetch the missing tail
+candle_store = CandleStore(DATA_DIR / "candles")
+
+# Bounded pool for blocking fyers.history calls so straddle legs load in parallel
+HISTORY_EXECUTOR = ThreadPoolExecutor(max_workers=6, thread_name_prefix="fyers-history")
+
+# Long windows are split into Fyers-sized chunks, fetched on their own pool under a shared rate limit
+HISTORY_CHUNK_WORKERS = 4
+HISTORY_REQUESTS_PER_SECOND = 8
+HISTORY_CHUNK_EXECUTOR = ThreadPoolExecutor(max_workers=HISTORY_CHUNK_WORKERS, thread_name_prefix="fyers-history-chunk")
+history_rate_limiter = RateLimiter(rate=HISTORY_REQUESTS_PER_SECOND, burst=HISTORY_REQUESTS_PER_SECOND)
+
+# Slow websocket clients are conflated to the latest tick per symbol, then dropped if still lagging
+WS_MAX_QUEUE = 500
+WS_DROP_LAG_SECONDS = 10.0
+manager = ConnectionManager(SlowConsumerPolicy(max_queue=WS_MAX_QUEUE, conflate=True, drop_lag_seconds=WS_DROP_LAG_SECONDS))
+
+# Live straddle prices for registered CE/PE pairs, published as STRADDLE:<index>:<expiry>:<strike> ticks
+straddle_engine = StraddleEngine(instrument_master)
+
+def publish_greeks(updates: List[Dict]):
+    for update in updates:
+        manager.broadcast(update)
 
-manager = ConnectionManager()
+# IV and Greeks for every option that ticks, recomputed once per loop cycle for contracts that moved;
+# published as GREEKS:<option symbol> ticks
+greeks_engine = GreeksEngine(instrument_master, INDEX_SYMBOLS, publish_greeks)
+
+# Live 1m/5m/15m bars built from the tick stream; closed bars go out over /ws as {"type": "bar", ...}
+bar_builder = BarBuilder()
+# Seconds past a bar's end before it is closed without a tick, so late ticks can still land in it
+BAR_CLOSE_GRACE = 2
+
+async def close_due_bars():
+    """Close bars for symbols that went quiet, once a second"""
+    while True:
+        await asyncio.sleep(1)
+        for bar in bar_builder.close_due(time.time() - BAR_CLOSE_GRACE):
+            manager.broadcast({"type": "bar", **bar})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    manager.start(asyncio.get_running_loop())
+    tick_journal.start()
+    greeks_engine.start(asyncio.get_running_loop())
+    bar_task = asyncio.create_task(close_due_bars())
     try:
         logger.info("Validating Fyers access token")
         access_token = ensure_valid_token()
@@ -125,9 +128,9 @@ async def lifespan(app: FastAPI):
     # Shutdown
     if fyers_socket and fyers_socket.is_connected():
         fyers_socket.close()
-    # Signal broadcast thread to stop
-    manager.message_queue.put(None)
-    manager.broadcast_thread.join(timeout=5)
+    bar_task.cancel()
+    await manager.stop()
+    tick_journal.close()
 
 app = FastAPI(title="Trading Data API", lifespan=lifespan)
 
@@ -142,7 +145,8 @@ app.add_middleware(
 
 # Global WebSocket client
 fyers_socket = None
-market_data_cache = {}
+# Latest tick and recent tick history per symbol
+tick_store = TickStore()
 
 def on_message(message):
     """Callback for WebSocket messages"""
@@ -177,6 +181,12 @@ def on_message(message):
                 # Update cache and broadcast
                 update_market_data(symbol, market_update)
                 manager.broadcast_sync(market_update)
+                for bar in bar_builder.update(market_update):
+                    manager.broadcast_sync({"type": "bar", **bar})
+                straddle_update = straddle_engine.on_tick(market_update)
+                if straddle_update:
+                    manager.broadcast_sync(straddle_update)
+                greeks_engine.on_tick(market_update)
                 
                 # Log index updates
                 if symbol in INDEX_SYMBOLS.values():
@@ -197,6 +207,26 @@ def on_close():
     """Callback for WebSocket close"""
     logger.info("Fyers WebSocket connection closed")
 
+def feed_symbols(symbols: List[str]) -> List[str]:
+    """Drop symbols computed here (live straddles and Greeks) that the Fyers feed doesn't know"""
+    return [symbol for symbol in symbols if not (is_straddle_symbol(symbol) or is_greeks_symbol(symbol))]
+
+def subscribe_upstream(symbols: List[str]):
+    """Subscribe symbols on the Fyers feed (called by the manager on first client reference)"""
+    symbols = feed_symbols(symbols)
+    if symbols and fyers_socket and fyers_socket.is_connected():
+        fyers_socket.subscribe(symbols=symbols, data_type="SymbolUpdate")
+        logger.info(f"Subscribed upstream: {symbols}")
+
+def unsubscribe_upstream(symbols: List[str]):
+    """Unsubscribe symbols no websocket client is watching any more"""
+    symbols = feed_symbols(symbols)
+    if symbols and fyers_socket and fyers_socket.is_connected():
+        fyers_socket.unsubscribe(symbols=symbols, data_type="SymbolUpdate")
+        logger.info(f"Unsubscribed upstream: {symbols}")
+
+manager.set_upstream(subscribe_upstream, unsubscribe_upstream, pinned=INDEX_SYMBOLS.values())
+
 async def initialize_websocket():
     """Initialize Fyers WebSocket connection"""
     try:
@@ -224,8 +254,8 @@ async def initialize_websocket():
             on_message=on_message
         )
         
-        # Subscribe to indices
-        symbols = list(INDEX_SYMBOLS.values())
+        # Subscribe to indices plus whatever websocket clients are watching
+        symbols = list(dict.fromkeys(list(INDEX_SYMBOLS.values()) + feed_symbols(manager.upstream_symbols())))
         logger.info(f"Subscribing to symbols: {symbols}")
         
         # Connect first
@@ -247,24 +277,11 @@ async def initialize_websocket():
         logger.exception("Full traceback:")
 
 def update_market_data(symbol: str, data: Dict):
-    """Update market data in memory and optionally save to parquet"""
+    """Update market data in memory and journal the tick"""
     try:
-        market_data_cache[symbol] = {
-            "data": data,
-            "timestamp": datetime.fromtimestamp(data.get('timestamp', time.time()), pytz.timezone('Asia/Kolkata'))
-        }
-        
-        # Save to parquet every 5 minutes
-        cache_file = CACHE_DIR / f"{symbol.replace(':', '_')}.parquet"
-        current_time = datetime.now()
-        
-        if not cache_file.exists() or (current_time - datetime.fromtimestamp(cache_file.stat().st_mtime)).total_seconds() > 300:  # 5 minutes
-            df = pd.DataFrame([data])
-            df['timestamp'] = pd.Timestamp.fromtimestamp(data.get('timestamp', time.time()), tz='Asia/Kolkata')
-            if cache_file.exists():
-                existing_df = pd.read_parquet(cache_file)
-                df = pd.concat([existing_df, df]).tail(1000)  # Keep last 1000 records
-            df.to_parquet(cache_file, index=False)
+        tick_store.update(symbol, data)
+        # Queued for the journal's writer thread, no file I/O on the feed callback
+        tick_journal.record(data)
             
     except Exception as e:
         logger.error(f"Error updating market data: {str(e)}")
@@ -272,135 +289,186 @@ def update_market_data(symbol: str, data: Dict):
 
 def get_market_data(symbol: str) -> Optional[float]:
     """Get latest market data for a symbol"""
-    if symbol in market_data_cache:
-        return market_data_cache[symbol]["data"].get("ltp")
+    ltp = tick_store.ltp(symbol)
+    if ltp is not None:
+        return ltp
     
-    # Try to get from parquet if exists
-    cache_file = CACHE_DIR / f"{symbol.replace(':', '_')}.parquet"
-    if cache_file.exists():
-        df = pd.read_parquet(cache_file)
-        if not df.empty:
-            return df.iloc[-1].get("ltp")
+    # Fall back to the last journaled tick, e.g. right after a restart
+    tick = tick_journal.last(symbol)
+    if tick is not None:
+        return tick.get("ltp")
     
     return None
 
-def get_current_index_price(index: str) -> float:
-    """Get current index price using Fyers API"""
-    try:
-        # Read access token
-        token_path = DATA_DIR / "access_token.txt"
-        if not token_path.exists():
-            logger.error("Access token file not found")
-            raise HTTPException(status_code=404, detail="Access token file not found")
-
-        with open(token_path, 'r') as f:
-            access_token = f.read().strip()
+def fetch_quotes(symbols: List[str]) -> Dict[str, Dict]:
+    """One fyers.quotes call for up to 50 symbols, in the same shape as live ticks"""
+    fyers = fyers_client.get()
+    response = fyers.quotes(data={"symbols": ",".join(symbols)})
+    if response.get('s') != 'ok':
+        raise RuntimeError(f"Error in Fyers response: {response}")
+
+    quotes = {}
+    for entry in response.get('d', []):
+        values = entry.get('v', {})
+        if entry.get('s') != 'ok' or 'lp' not in values:
+            continue
+        quotes[entry.get('n')] = {
+            'symbol': entry.get('n'),
+            'timestamp': int(values.get('tt') or time.time()),
+            'ltp': float(values.get('lp', 0)),
+            'open': float(values.get('open_price', 0)),
+            'high': float(values.get('high_price', 0)),
+            'low': float(values.get('low_price', 0)),
+            'prev_close': float(values.get('prev_close_price', 0)),
+            'change': float(values.get('ch', 0)),
+            'change_percent': float(values.get('chp', 0)),
+            'volume': int(values.get('volume', 0)),
+        }
+    return quotes
 
-        # Initialize Fyers model
-        fyers = fyersModel.FyersModel(client_id=os.getenv("FYERS_CLIENT_ID"), is_async=False, token=access_token)
+# Answers from live ticks when fresh, otherwise one coalesced REST call per symbol per TTL
+quote_service = QuoteService(fetch_quotes, lambda symbol: tick_store.latest(symbol))
 
+def get_current_index_price(index: str) -> float:
+    """Get current index price from the live feed, falling back to the Fyers quotes API"""
+    try:
         # Get index symbol
         index_symbol = INDEX_SYMBOLS.get(index)
         if not index_symbol:
             logger.error(f"Index symbol not found for index: {index}")
             raise HTTPException(status_code=400, detail=f"Invalid index: {index}")
 
-        # Get current market price
-        symbol_data = {"symbols": index_symbol}
-        quote_response = fyers.quotes(data=symbol_data)
-
-        if quote_response.get('s') == 'ok':
-            lp = quote_response.get('d', [{}])[0].get('v', {}).get('lp', 0)
-            logger.info(f"Current price for {index}: {lp}")
-            return float(lp)
-        else:
-            logger.error(f"Error in Fyers response: {quote_response}")
-            raise HTTPException(status_code=500, detail="Failed to fetch current index price from Fyers API")
+        quote = quote_service.quote(index_symbol)
+        if quote is None:
+            logger.error(f"No quote returned for {index_symbol}")
+            return 0
+        logger.info(f"Current price for {index}: {quote['ltp']} ({quote['source']})")
+        return float(quote['ltp'])
 
     except Exception as e:
         logger.error(f"Error getting current index price: {str(e)}")
         return 0
 
+# Most symbols one /quotes request may ask for
+MAX_QUOTE_SYMBOLS = 200
+
+@app.get("/quotes")
+async def get_quotes(symbols: str):
+    """
+    Latest quotes for comma-separated symbols; index names such as NIFTY are accepted too.
+    Live ticks answer where fresh, the rest come from batched fyers.quotes calls of up to 50.
+    Symbols Fyers doesn't know come back as null.
+    """
+    requested = [symbol.strip() for symbol in symbols.split(",") if symbol.strip()]
+    if not requested:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(requested) > MAX_QUOTE_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_QUOTE_SYMBOLS} symbols per request")
+
+    resolved = {symbol: INDEX_SYMBOLS.get(symbol, symbol) for symbol in requested}
+    try:
+        quotes = await asyncio.to_thread(quote_service.quotes, list(resolved.values()))
+    except Exception as e:
+        logger.error(f"Error fetching quotes: {str(e)}")
+        raise HTTPException(status_code=502, detail="Failed to fetch quotes from Fyers API")
+    return {"quotes": {symbol: quotes[fyers_symbol] for symbol, fyers_symbol in resolved.items()}}
+
 @app.get("/index-strikes/{index}")
-async def get_index_strikes(index: str):
+async def get_index_strikes(index: str, window: int = Query(5, ge=0, le=50), expiry: Optional[str] = None):
+    """
+    `window` strikes either side of the ATM strike. Strikes span every listed expiry
+    unless `expiry` (YYYY-MM-DD) picks one.
+    """
     try:
-        # Read the master data file
-        master_df = pd.read_csv(DATA_DIR / "master_file.csv")
-        
-        # Filter options based on exSymbol
-        index_options = master_df[
-            (master_df['exSymbol'] == index) & 
-            (master_df['exSymName'].str.contains('CE|PE'))  # Only get options
-        ]
-        
-        if index_options.empty:
+        chosen = None
+        if expiry:
+            try:
+                chosen = instrument_master.resolve_expiry(index, expiry)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid expiry: {expiry}")
+            if chosen is None:
+                raise HTTPException(status_code=404, detail=f"No {index} options expire on {expiry}")
+
+        if instrument_master.strikes(index, chosen).size == 0:
             raise HTTPException(status_code=404, detail=f"No options found for index {index}")
         
-        # Extract strike prices and convert to numeric
-        strikes = pd.to_numeric(index_options['strikePrice'].unique(), errors='coerce')
-        
-        # Get current index price from Fyers API
-        current_price = get_current_index_price(index)
+        # Live price when fresh, else a cached or coalesced Fyers quote; kept off the event loop
+        current_price = await asyncio.to_thread(get_current_index_price, index)
         
         if current_price == 0:
             raise HTTPException(status_code=500, detail="Failed to get current index price")
         
-        # Find the nearest strike price
-        nearest_strike = strikes[abs(strikes - current_price).argmin()]
-        
-        # Get strike index and select surrounding strikes
-        strike_idx = list(strikes).index(nearest_strike)
-        
-        # Get 5 strikes below and 5 strikes above
-        start_idx = max(0, strike_idx - 5)
-        end_idx = min(len(strikes), strike_idx + 6)
-        selected_strikes = strikes[start_idx:end_idx].tolist()
+        # Binary search over the master's sorted strikes
+        selected_strikes, nearest_strike = instrument_master.nearest_strikes(index, current_price, window, chosen)
         
         return {
-            "strikes": selected_strikes,
+            "strikes": selected_strikes.tolist(),
             "default_strike": nearest_strike,
             "current_price": current_price,
-            "index_symbol": INDEX_SYMBOLS.get(index)
+            "index_symbol": INDEX_SYMBOLS.get(index),
+            "expiry": f"{chosen:%Y-%m-%d}" if chosen is not None else None
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting strike prices: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def fetch_history_chunk(symbol: str, range_from: int, range_to: int) -> pd.DataFrame:
+    """Fetch one Fyers-sized window of 1-minute candles (epoch seconds)"""
+    data = {
+        "symbol": symbol,
+        "resolution": "1",
+        "date_format": "0",
+        "range_from": str(range_from),
+        "range_to": str(range_to),
+        "cont_flag": "1"
+    }
+
+    response = fyers_client.get().history(data=data)
+    if response.get("s") not in ("ok", "no_data"):
+        raise ValueError(f"Fyers history error for {symbol}: {response}")
+    return pd.DataFrame(response.get("candles") or [], columns=CANDLE_COLUMNS)
+
+def fetch_history(symbol: str, range_from: int, range_to: int) -> pd.DataFrame:
+    """Fetch 1-minute candles for any window, chunked to Fyers limits and fetched concurrently"""
+    ranges = plan_ranges(range_from, range_to, resolution="1")
+    if not ranges:
+        return pd.DataFrame(columns=CANDLE_COLUMNS)
+    return fetch_ranges(
+        lambda chunk_from, chunk_to: fetch_history_chunk(symbol, chunk_from, chunk_to),
+        ranges, HISTORY_CHUNK_EXECUTOR, history_rate_limiter
+    )
+
 def get_historical_data(symbol, days_back=10):
+    """1-minute candles for the last days_back days, served from the candle store and topped up from Fyers"""
     try:
-        token_path = DATA_DIR / "access_token.txt"
-        with open(token_path, 'r') as f:
-            access_token = f.read().strip()
+        ist = pytz.timezone('Asia/Kolkata')
+        now = int(time.time())
+        window_start = ist.localize(
+            datetime.combine(datetime.now(ist).date() - timedelta(days=days_back), datetime.min.time())
+        )
+        window_start = int(window_start.timestamp())
 
-        fyers = fyersModel.FyersModel(client_id="OGS4N9MW72", is_async=False, token=access_token)
-        
-        today = datetime.today()
-        range_from = (today - timedelta(days=days_back)).strftime('%Y-%m-%d')
-        range_to = (today + timedelta(days=1)).strftime('%Y-%m-%d')
-
-        data = {
-            "symbol": symbol,
-            "resolution": "1",
-            "date_format": "1",
-            "range_from": range_from,
-            "range_to": range_to,
-            "cont_flag": "1"
-        }
+        with candle_store.lock(symbol):
+            meta = candle_store.meta(symbol)
+            if meta.get("covered_from", now) <= window_start and "last_timestamp" in meta:
+                # Only the tail is missing; refetch from the last stored bar as it may have been forming
+                fetch_from = meta["last_timestamp"]
+            else:
+                fetch_from = window_start
+
+            candles = fetch_history(symbol, fetch_from, now)
+            candle_store.append(symbol, candles, covered_from=fetch_from)
+            logger.info(f"Fetched {len(candles)} candles for {symbol} since {fetch_from}")
 
-        response = fyers.history(data=data)
-        df = pd.DataFrame(response["candles"], 
-                         columns=["timestamp", "open", "high", "low", "close", "volume"])
+            df = candle_store.read(symbol, window_start)
         
         # Convert UTC timestamp to IST timezone and format as YYYY-MM-DD HH:mm
-        ist = pytz.timezone('Asia/Kolkata')
         df["date"] = pd.to_datetime(df["timestamp"], unit="s", utc=True).dt.tz_convert(ist).dt.strftime('%Y-%m-%d %H:%M')
-        df = df[["date", "open", "high", "low", "close", "volume"]]
-        
-        output_path = DATA_DIR / f"{symbol.replace(':', '_')}.csv"
-        df.to_csv(output_path, index=False)
-        logger.info(f"Historical data saved to {output_path}")
+        df = df[["timestamp", "date", "open", "high", "low", "close", "volume"]]
         
         return df
         
@@ -408,66 +476,41 @@ def get_historical_data(symbol, days_back=10):
         logger.error(f"Error in get_historical_data: {str(e)}")
         raise
 
-def get_historical_straddle(index: str, strikePrice: str, days_back: int = 10) -> Dict[str, Any]:
-    """Get historical straddle data for a given index and strike price"""
+def get_historical_straddle_frames(index: str, strikePrice: str, days_back: int = 10) -> Dict[str, Any]:
+    """Fetch CE, PE and spot candles plus the aligned straddle series as DataFrames"""
     try:
-        # Load master data
-        csv_path = DATA_DIR / "master_file.csv"
-        if not csv_path.exists():
+        # Resolve CE and PE symbols for the nearest expiry from the in-memory master
+        try:
+            straddle = instrument_master.straddle(index, float(strikePrice))
+        except FileNotFoundError:
             logger.error("Master file not found")
             raise HTTPException(status_code=404, detail="Master file not found")
         
-        df = pd.read_csv(csv_path)
-        
-        # Filter for the given index and strike price
-        filtered_df = df[(df['exSymbol'].str.contains(index)) & 
-                        (df['strikePrice'] == float(strikePrice))]
-        
-        if filtered_df.empty:
-            logger.error(f"No data found for index: {index} with strike price: {strikePrice}")
-            raise HTTPException(status_code=404, detail="No data found for given criteria")
-        
-        # Sort by expiry date and get the nearest expiry
-        filtered_df = filtered_df.sort_values('expiryDate')
-        nearest_expiry = filtered_df['expiryDate'].iloc[0] if not filtered_df.empty else None
-        
-        if nearest_expiry is None:
-            logger.error("No expiry date found for the filtered criteria")
+        if straddle is None:
+            logger.error(f"No CE/PE pair found for index: {index} with strike price: {strikePrice}")
             raise HTTPException(status_code=404, detail="No data found for given criteria")
-            
-        # Get CE and PE symbols
-        ce_filtered = filtered_df[filtered_df['symbol'].str.endswith('CE')]
-        pe_filtered = filtered_df[filtered_df['symbol'].str.endswith('PE')]
         
-        if ce_filtered.empty or pe_filtered.empty:
-            logger.error("CE or PE data not found for given criteria")
-            raise HTTPException(status_code=404, detail="CE or PE data not found for given criteria")
-
-        ce_data = ce_filtered.iloc[0]
-        pe_data = pe_filtered.iloc[0]
-        logger.info(f"CE Data: {ce_data['symbol']}")
-        logger.info(f"PE Data: {pe_data['symbol']}")
+        nearest_expiry, ce_symbol, pe_symbol = straddle
+        logger.info(f"CE Data: {ce_symbol}")
+        logger.info(f"PE Data: {pe_symbol}")
         
-        # Get historical data
-        ce_hist = get_historical_data(ce_data['symbol'], days_back)
-        pe_hist = get_historical_data(pe_data['symbol'], days_back)
-        spot_hist = get_historical_data(INDEX_SYMBOLS[index], days_back)
-        
-        # Prepare CE and PE data with symbol names
-        ce_json = {
-            "symbol": ce_data['symbol'],
-            "data": ce_hist[['date', 'open', 'high', 'low', 'close', 'volume']].values.tolist()
-        }
-        pe_json = {
-            "symbol": pe_data['symbol'],
-            "data": pe_hist[['date', 'open', 'high', 'low', 'close', 'volume']].values.tolist()
-        }
+        # Fetch CE, PE and spot history concurrently
+        spot_symbol = INDEX_SYMBOLS[index]
+        ce_future = HISTORY_EXECUTOR.submit(get_historical_data, ce_symbol, days_back)
+        pe_future = HISTORY_EXECUTOR.submit(get_historical_data, pe_symbol, days_back)
+        spot_future = HISTORY_EXECUTOR.submit(get_historical_data, spot_symbol, days_back)
+        ce_hist = ce_future.result()
+        pe_hist = pe_future.result()
+        spot_hist = spot_future.result()
         
         logger.info(f"Successfully fetched historical straddle data for index: {index}, strike price: {strikePrice}")
         
         return {
-            "ce_data": ce_json,
-            "pe_data": pe_json
+            "ce_data": {"symbol": ce_symbol, "frame": ce_hist},
+            "pe_data": {"symbol": pe_symbol, "frame": pe_hist},
+            "spot_data": {"symbol": spot_symbol, "frame": spot_hist},
+            # Aligned straddle series so clients don't have to join the legs themselves
+            "straddle": build_straddle_series(ce_hist, pe_hist, spot_hist)
         }
         
     except HTTPException as he:
@@ -477,29 +520,114 @@ def get_historical_straddle(index: str, strikePrice: str, days_back: int = 10) -
         logger.error(f"Error in get_historical_straddle: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+def get_historical_straddle(index: str, strikePrice: str, days_back: int = 10) -> Dict[str, Any]:
+    """Get historical straddle data for a given index and strike price, as rows"""
+    frames = get_historical_straddle_frames(index, strikePrice, days_back)
+    result = {
+        leg: {
+            "symbol": frames[leg]["symbol"],
+            "data": frames[leg]["frame"][['date', 'open', 'high', 'low', 'close', 'volume']].values.tolist()
+        }
+        for leg in LEG_KEYS
+    }
+    series = frames["straddle"]
+    result["straddle"] = {
+        "columns": series.columns.tolist(),
+        "data": series.astype(object).where(series.notna(), None).values.tolist()
+    }
+    return result
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[str, list]:
+    """One list per column, with NaN as null"""
+    columns = {}
+    for name, column in df.items():
+        if column.dtype.kind == 'f' and column.isna().any():
+            columns[name] = column.astype(object).where(column.notna(), None).tolist()
+        else:
+            columns[name] = column.tolist()
+    return columns
+
+def get_historical_straddle_columnar(frames: Dict[str, Any]) -> Dict[str, Any]:
+    """Columnar JSON body: one array per field and epoch-second timestamps instead of date strings"""
+    result = {
+        leg: {
+            "symbol": frames[leg]["symbol"],
+            **frame_to_columns(frames[leg]["frame"][CANDLE_COLUMNS].astype({"timestamp": "int64"}))
+        }
+        for leg in LEG_KEYS
+    }
+    result["straddle"] = frame_to_columns(frames["straddle"].drop(columns=["date"]))
+    return result
+
+def get_historical_straddle_arrow(frames: Dict[str, Any]) -> bytes:
+    """
+    Arrow IPC streams written back to back: the aligned straddle series, then one stream of
+    candles per leg in LEG_KEYS order. The straddle schema metadata names every leg's symbol;
+    each leg's metadata carries its own `leg` and `symbol`.
+    """
+    tables = [pa.Table.from_pandas(frames["straddle"].drop(columns=["date"]), preserve_index=False)
+              .replace_schema_metadata({f"{leg}_symbol": frames[leg]["symbol"] for leg in LEG_KEYS})]
+    for leg in LEG_KEYS:
+        candles = frames[leg]["frame"][CANDLE_COLUMNS].astype({"timestamp": "int64"})
+        tables.append(pa.Table.from_pandas(candles, preserve_index=False)
+                      .replace_schema_metadata({"leg": leg, "symbol": frames[leg]["symbol"]}))
+
+    sink = pa.BufferOutputStream()
+    for table in tables:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
 class HistoricalData(BaseModel):
     symbol: str
     data: List[List[Any]]  # List of [date, close] pairs
 
+class StraddleSeries(BaseModel):
+    columns: List[str]
+    data: List[List[Any]]  # One row per aligned bar, in `columns` order
+
 class HistoricalStraddleResponse(BaseModel):
     ce_data: HistoricalData
     pe_data: HistoricalData
+    spot_data: Optional[HistoricalData] = None
+    straddle: Optional[StraddleSeries] = None
+
+# Longest history /historical_straddle serves; one year is a handful of chunked calls per leg
+MAX_DAYS_BACK = 365
 
 @app.get("/historical_straddle/{index}/{strikePrice}", response_model=HistoricalStraddleResponse)
-def historical_straddle_endpoint(index: str, strikePrice: str):
+def historical_straddle_endpoint(index: str, strikePrice: str, days_back: int = Query(10, ge=1, le=MAX_DAYS_BACK),
+                                 format: Optional[str] = None, accept: Optional[str] = Header(None)):
     """
-    Endpoint to retrieve historical straddle data (CE and PE) for a given index and strike price.
+    Endpoint to retrieve historical straddle data (CE, PE and spot) for a given index and strike price.
 
     - **index**: The market index (e.g., NIFTY, BANKNIFTY)
     - **strikePrice**: The strike price as a string (e.g., "23400")
-    - **days_back**: Number of days back for historical data (optional, default is 10)
+    - **days_back**: Number of days back for historical data, 1 to 365 (optional, default is 10)
+    - **format**: `rows` (default), `columnar` for a JSON object of arrays, or `arrow` for
+      consecutive Arrow IPC streams: the straddle series, then CE, PE and spot candles.
+      `Accept: application/vnd.apache.arrow.stream` also selects `arrow`.
     """
     try:
         logger.info(f"Received request for historical straddle data: Index={index}, Strike Price={strikePrice}")
-        straddle_data = get_historical_straddle(index, strikePrice)
+        if format is None:
+            format = "arrow" if accept and ARROW_STREAM_MEDIA_TYPE in accept else "rows"
+        if format not in ("rows", "columnar", "arrow"):
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+
+        if format == "columnar":
+            frames = get_historical_straddle_frames(index, strikePrice, days_back)
+            return JSONResponse(get_historical_straddle_columnar(frames))
+        if format == "arrow":
+            frames = get_historical_straddle_frames(index, strikePrice, days_back)
+            return Response(get_historical_straddle_arrow(frames), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+        straddle_data = get_historical_straddle(index, strikePrice, days_back)
         return HistoricalStraddleResponse(
             ce_data=HistoricalData(**straddle_data["ce_data"]),
-            pe_data=HistoricalData(**straddle_data["pe_data"])
+            pe_data=HistoricalData(**straddle_data["pe_data"]),
+            spot_data=HistoricalData(**straddle_data["spot_data"]),
+            straddle=StraddleSeries(**straddle_data["straddle"])
         )
     except HTTPException as he:
         logger.error(f"HTTPException in endpoint: {he.detail}")
@@ -509,16 +637,24 @@ def historical_straddle_endpoint(index: str, strikePrice: str):
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, batch_ms: int = 0, encoding: str = "json"):
+    # ?batch_ms=100 coalesces ticks into one frame per interval with the latest update per symbol
+    # ?encoding=delta sends each symbol's full record once, then {"id": n, <changed fields>}
+    if encoding not in WS_ENCODINGS:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    client = await manager.connect(websocket, encoding)
+    if batch_ms > 0:
+        client.set_batch_interval(batch_ms)
     try:
         if not fyers_socket or not fyers_socket.is_connected():
             await initialize_websocket()
             
         while True:
-            # Keep connection alive and wait for messages
+            # Clients send {"action": "subscribe" | "unsubscribe", "symbols": [...]}
+            # or {"action": "batch", "interval_ms": 100} (0 turns batching off)
             data = await websocket.receive_text()
-            # You can handle client messages here if needed
+            manager.handle_client_message(websocket, data)
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -526,6 +662,156 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket error: {str(e)}")
         manager.disconnect(websocket)
 
+OPTION_CHAIN_COLUMNS = [
+    "strike",
+    "ce_symbol", "ce_ltp", "ce_iv", "ce_delta", "ce_gamma", "ce_theta", "ce_vega",
+    "pe_symbol", "pe_ltp", "pe_iv", "pe_delta", "pe_gamma", "pe_theta", "pe_vega",
+]
+def option_chain_symbols(index: str, expiry: pd.Timestamp) -> Dict[str, List[Optional[str]]]:
+    """CE and PE symbols for every strike of one expiry, None where a leg is not listed"""
+    strikes = instrument_master.strikes(index, expiry)
+    return {
+        option_type: [instrument_master.contract(index, expiry, strike, option_type) for strike in strikes]
+        for option_type in ("CE", "PE")
+    }
+
+def option_chain_prices(symbols: List[str]) -> Dict[str, float]:
+    """Last price per symbol: the live feed, then batched single-flight REST quotes for the rest"""
+    prices = {}
+    for symbol in symbols:
+        ltp = tick_store.ltp(symbol)
+        if ltp is not None:
+            prices[symbol] = ltp
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if missing:
+        try:
+            for symbol, quote in quote_service.quotes(missing).items():
+                if quote is not None:
+                    prices[symbol] = quote['ltp']
+        except Exception as e:
+            # Chain rows without a price come back null rather than failing the request
+            logger.error(f"Error fetching option chain quotes: {str(e)}")
+    return prices
+
+def build_option_chain(index: str, expiry: pd.Timestamp, spot: float, now: pd.Timestamp,
+                       prices: Dict[str, float]) -> pd.DataFrame:
+    """Every strike of one expiry with CE/PE prices from `prices`, implied volatility and Greeks"""
+    strikes = instrument_master.strikes(index, expiry)
+    years = instrument_master.years_to_expiry(expiry, now)
+    chain = pd.DataFrame({"strike": strikes})
+
+    for option_type, symbols in option_chain_symbols(index, expiry).items():
+        prefix = option_type.lower()
+        ltps = np.array([prices.get(symbol) if symbol else None for symbol in symbols], dtype=float)
+        is_call = option_type == "CE"
+
+        # One vectorised solve per side for the whole chain
+        iv = implied_volatility(ltps, spot, strikes, years, RISK_FREE_RATE, is_call)
+        chain[f"{prefix}_symbol"] = symbols
+        chain[f"{prefix}_ltp"] = ltps
+        chain[f"{prefix}_iv"] = iv * 100
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for name, values in greeks(spot, strikes, years, RISK_FREE_RATE, iv, is_call).items():
+                chain[f"{prefix}_{name}"] = values
+
+    return chain[OPTION_CHAIN_COLUMNS]
+
+@app.get("/option-chain/{index}")
+async def get_option_chain(index: str, expiry: Optional[str] = None):
+    """
+    Option chain for one expiry (nearest unexpired when omitted) from live prices, with
+    REST quotes for legs the feed has not ticked. IV is in percent, theta per day and vega
+    per volatility point; null where a leg has no price or it is outside no-arbitrage bounds.
+    """
+    if index not in INDEX_SYMBOLS:
+        raise HTTPException(status_code=404, detail=f"Unknown index: {index}")
+    now = instrument_master.utc_now()
+    try:
+        chosen = instrument_master.resolve_expiry(index, expiry, now)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid expiry: {expiry}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Master file not found")
+    if chosen is None:
+        raise HTTPException(status_code=404, detail=f"No {index} options for expiry {expiry or 'after today'}")
+
+    spot = tick_store.ltp(INDEX_SYMBOLS[index]) or await asyncio.to_thread(get_current_index_price, index)
+    if not spot:
+        raise HTTPException(status_code=503, detail="Index price unavailable")
+
+    symbols = [symbol for legs in option_chain_symbols(index, chosen).values() for symbol in legs if symbol]
+    prices = await asyncio.to_thread(option_chain_prices, symbols)
+    chain = build_option_chain(index, chosen, float(spot), now, prices)
+    return {
+        "index": index,
+        "expiry": f"{chosen:%Y-%m-%d}",
+        "spot": spot,
+        "columns": chain.columns.tolist(),
+        "data": chain.astype(object).where(chain.notna(), None).values.tolist(),
+    }
+
+class StraddleRegistration(BaseModel):
+    index: str
+    strike: float
+    expiry: Optional[str] = None  # YYYY-MM-DD; nearest unexpired expiry when omitted
+
+@app.post("/straddles")
+async def register_straddle(registration: StraddleRegistration):
+    """Start computing a live straddle; subscribe to its `symbol` on /ws for updates"""
+    if registration.index not in INDEX_SYMBOLS:
+        raise HTTPException(status_code=404, detail=f"Unknown index: {registration.index}")
+    try:
+        expiry = pd.Timestamp(registration.expiry) if registration.expiry else None
+        straddle, new_legs = straddle_engine.register(
+            registration.index, registration.strike, expiry, last_price=tick_store.ltp
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid expiry: {registration.expiry}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Master file not found")
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    # Legs share the feed subscription refcounts with websocket clients
+    manager.acquire_upstream(new_legs)
+    update = straddle.update()
+    if update:
+        manager.broadcast(update)
+    return {"symbol": straddle.key, "ce_symbol": straddle.ce_symbol, "pe_symbol": straddle.pe_symbol,
+            "straddle_price": update["straddle_price"] if update else None}
+
+@app.get("/straddles")
+async def list_straddles():
+    """Registered live straddles with their latest prices"""
+    return {"straddles": straddle_engine.straddles()}
+
+@app.delete("/straddles/{key}")
+async def unregister_straddle(key: str):
+    """Drop one registration; the legs are unsubscribed once nothing else uses them"""
+    try:
+        released = straddle_engine.unregister(key)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Straddle not registered: {key}")
+    manager.release_upstream(released)
+    return {"symbol": key, "released": released}
+
+@app.get("/bars/{symbol}")
+async def get_live_bars(symbol: str, interval: str = "1m", limit: int = 100):
+    """Closed bars built from the live feed plus the bar still forming"""
+    if interval not in BAR_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}. Use one of {list(BAR_INTERVALS)}")
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "bars": bar_builder.bars(symbol, interval, limit),
+        "forming": bar_builder.forming(symbol, interval),
+    }
+
+@app.get("/ws/metrics")
+async def websocket_metrics():
+    """Backlog, conflation and drop counters for websocket clients"""
+    return {**manager.metrics(), "greeks": greeks_engine.metrics()}
+
 @app.get("/")
 async def root():
     """Root endpoint to check API status"""
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# A live tick younger than this (seconds, by exchange time) answers without a REST call
+MAX_LIVE_AGE = 5.0
+# How long a REST quote is reused
+QUOTE_TTL = 2.0
+# Symbols Fyers accepts in one quotes request
+MAX_SYMBOLS_PER_REQUEST = 50
+
+
+class QuoteService:
+    """
+    Latest quote per symbol: the live feed when it is fresh, otherwise a REST quote
+    cached for QUOTE_TTL seconds.
+
+    Concurrent misses for a symbol share one in-flight REST call (single-flight):
+    the first caller fetches, later callers wait on its Future, so a burst costs at most
+    one upstream request per symbol per TTL.
+    """
+
+    def __init__(self, fetch: Callable[[List[str]], Dict[str, Dict]], live: Callable[[str], Optional[Dict]],
+                 max_live_age: float = MAX_LIVE_AGE, ttl: float = QUOTE_TTL,
+                 batch_size: int = MAX_SYMBOLS_PER_REQUEST):
+        self.fetch = fetch
+        self.live = live
+        self.max_live_age = max_live_age
+        self.ttl = ttl
+        self.batch_size = batch_size
+        # symbol -> (fetched_at monotonic, quote)
+        self._cache: Dict[str, tuple] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.rest_calls = 0
+
+    def quote(self, symbol: str) -> Optional[Dict]:
+        """Quote with its `source` (live or rest); None when REST has nothing for the symbol"""
+        return self.quotes([symbol])[symbol]
+
+    def quotes(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """
+        Quotes for many symbols. Fresh live ticks and cached quotes are used as they are;
+        the rest go upstream in chunks of `batch_size`, sharing calls already in flight.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        results: Dict[str, Optional[Dict]] = {}
+        misses = []
+        now = time.time()
+        for symbol in symbols:
+            tick = self.live(symbol)
+            if tick is not None and now - tick.get('timestamp', 0) <= self.max_live_age:
+                results[symbol] = {**tick, 'source': "live"}
+            else:
+                misses.append(symbol)
+
+        waiting: Dict[str, Future] = {}
+        leading: Dict[str, Future] = {}
+        with self._lock:
+            for symbol in misses:
+                cached = self._cache.get(symbol)
+                if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                    results[symbol] = cached[1]
+                elif symbol in self._inflight:
+                    waiting[symbol] = self._inflight[symbol]
+                else:
+                    leading[symbol] = self._inflight[symbol] = Future()
+
+        pending = list(leading)
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                with self._lock:
+                    self.rest_calls += 1
+                fetched = self.fetch(chunk)
+                quotes = {symbol: ({**fetched[symbol], 'source': "rest"} if symbol in fetched else None)
+                          for symbol in chunk}
+                with self._lock:
+                    for symbol, quote in quotes.items():
+                        if quote is not None:
+                            self._cache[symbol] = (time.monotonic(), quote)
+                        del self._inflight[symbol]
+                for symbol, quote in quotes.items():
+                    leading[symbol].set_result(quote)
+                    results[symbol] = quote
+        except Exception as e:
+            # Fail this chunk and every chunk not fetched yet, for us and anyone waiting on them
+            unsettled = [symbol for symbol in pending if not leading[symbol].done()]
+            with self._lock:
+                for symbol in unsettled:
+                    del self._inflight[symbol]
+            for symbol in unsettled:
+                leading[symbol].set_exception(e)
+            raise
+
+        for symbol, future in waiting.items():
+            results[symbol] = future.result()
+        return {symbol: results[symbol] for symbol in symbols}
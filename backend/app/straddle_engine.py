@@ -0,0 +1,147 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from instrument_master import InstrumentMaster
+
+# Live straddles are published as ticks for pseudo-symbols with this prefix,
+# e.g. STRADDLE:NIFTY:2025-01-16:23400
+STRADDLE_PREFIX = "STRADDLE:"
+
+
+def straddle_key(index: str, expiry: pd.Timestamp, strike: float) -> str:
+    return f"{STRADDLE_PREFIX}{index}:{expiry:%Y-%m-%d}:{strike:g}"
+
+
+def is_straddle_symbol(symbol: str) -> bool:
+    return symbol.startswith(STRADDLE_PREFIX)
+
+
+class LiveStraddle:
+    """One registered CE/PE pair and the last price seen for each leg"""
+
+    __slots__ = ("key", "index", "strike", "expiry", "ce_symbol", "pe_symbol",
+                 "ce_price", "pe_price", "timestamp", "registrations")
+
+    def __init__(self, key: str, index: str, strike: float, expiry: pd.Timestamp, ce_symbol: str, pe_symbol: str):
+        self.key = key
+        self.index = index
+        self.strike = strike
+        self.expiry = expiry
+        self.ce_symbol = ce_symbol
+        self.pe_symbol = pe_symbol
+        self.ce_price: Optional[float] = None
+        self.pe_price: Optional[float] = None
+        self.timestamp = 0
+        self.registrations = 0
+
+    def update(self) -> Optional[Dict]:
+        """The straddle tick, once both legs have a price"""
+        if self.ce_price is None or self.pe_price is None:
+            return None
+        return {
+            'symbol': self.key,
+            'timestamp': self.timestamp,
+            'index': self.index,
+            'strike': self.strike,
+            'expiry': f"{self.expiry:%Y-%m-%d}",
+            'ce_symbol': self.ce_symbol,
+            'pe_symbol': self.pe_symbol,
+            'ce_price': self.ce_price,
+            'pe_price': self.pe_price,
+            'straddle_price': round(self.ce_price + self.pe_price, 2),
+        }
+
+
+class StraddleEngine:
+    """
+    Combines live CE and PE ticks into straddle prices for registered (index, strike, expiry) pairs.
+
+    Each leg symbol maps straight to its straddle, so a tick costs one dict lookup and an
+    addition however many pairs are registered. Registrations are reference counted; the
+    caller subscribes the legs returned by register() and releases those from unregister().
+    """
+
+    def __init__(self, instrument_master: InstrumentMaster):
+        self.instrument_master = instrument_master
+        self._straddles: Dict[str, LiveStraddle] = {}
+        # leg symbol -> (straddle, "ce" | "pe")
+        self._legs: Dict[str, Tuple[LiveStraddle, str]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, index: str, strike: float, expiry: Optional[pd.Timestamp] = None,
+                 last_price: Optional[Callable[[str], Optional[float]]] = None,
+                 now: Optional[pd.Timestamp] = None) -> Tuple[LiveStraddle, List[str]]:
+        """
+        Start tracking a straddle, on the nearest unexpired expiry when none is given (`now`
+        is naive UTC). Returns the straddle and the leg symbols that need a feed subscription
+        (empty when it was already registered). Raises LookupError when the pair is not in
+        the master or no expiry is live.
+        """
+        listed = self.instrument_master.resolve_expiry(index, expiry, now)
+        if listed is None:
+            if expiry is None:
+                raise LookupError(f"No unexpired {index} options")
+            raise LookupError(f"No {index} options expire on {pd.Timestamp(expiry):%Y-%m-%d}")
+        expiry = listed
+        resolved = self.instrument_master.straddle(index, float(strike), expiry)
+        if resolved is None:
+            raise LookupError(f"No CE/PE pair for {index} {strike:g}")
+        expiry, ce_symbol, pe_symbol = resolved
+        key = straddle_key(index, expiry, float(strike))
+
+        with self._lock:
+            straddle = self._straddles.get(key)
+            new_legs = []
+            if straddle is None:
+                straddle = LiveStraddle(key, index, float(strike), expiry, ce_symbol, pe_symbol)
+                if last_price is not None:
+                    straddle.ce_price = last_price(ce_symbol)
+                    straddle.pe_price = last_price(pe_symbol)
+                self._straddles[key] = straddle
+                self._legs[ce_symbol] = (straddle, "ce")
+                self._legs[pe_symbol] = (straddle, "pe")
+                new_legs = [ce_symbol, pe_symbol]
+            straddle.registrations += 1
+            return straddle, new_legs
+
+    def unregister(self, key: str) -> List[str]:
+        """Drop one registration; returns the leg symbols to unsubscribe once none are left"""
+        with self._lock:
+            straddle = self._straddles.get(key)
+            if straddle is None:
+                raise KeyError(key)
+            straddle.registrations -= 1
+            if straddle.registrations > 0:
+                return []
+            del self._straddles[key]
+            del self._legs[straddle.ce_symbol]
+            del self._legs[straddle.pe_symbol]
+            return [straddle.ce_symbol, straddle.pe_symbol]
+
+    def on_tick(self, tick: Dict) -> Optional[Dict]:
+        """Apply a leg tick; returns the new straddle tick, or None for other symbols"""
+        leg = self._legs.get(tick['symbol'])
+        if leg is None:
+            return None
+        with self._lock:
+            straddle, side = leg
+            if side == "ce":
+                straddle.ce_price = tick['ltp']
+            else:
+                straddle.pe_price = tick['ltp']
+            straddle.timestamp = max(straddle.timestamp, int(tick.get('timestamp', 0)))
+            return straddle.update()
+
+    def straddles(self) -> List[Dict]:
+        """Every registered straddle with its latest values"""
+        with self._lock:
+            return [
+                straddle.update() or {
+                    'symbol': straddle.key, 'index': straddle.index, 'strike': straddle.strike,
+                    'expiry': f"{straddle.expiry:%Y-%m-%d}", 'ce_symbol': straddle.ce_symbol,
+                    'pe_symbol': straddle.pe_symbol, 'straddle_price': None,
+                }
+                for straddle in self._straddles.values()
+            ]
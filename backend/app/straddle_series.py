@@ -0,0 +1,73 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Bars a missing leg may be carried forward before the row is dropped
+FILL_LIMIT = 5
+# Fills stop at IST trading-day boundaries; IST is UTC+5:30
+IST_OFFSET_SECONDS = 19800
+DAY_SECONDS = 86400
+
+STRADDLE_COLUMNS = [
+    "timestamp", "date", "ce_price", "pe_price", "spot_price",
+    "straddle_open", "straddle_high", "straddle_low", "straddle_price",
+    "straddle_spot_ratio", "change", "change_percent",
+]
+
+
+def build_straddle_series(ce: pd.DataFrame, pe: pd.DataFrame, spot: Optional[pd.DataFrame] = None,
+                          fill_limit: int = FILL_LIMIT) -> pd.DataFrame:
+    """
+    Align CE, PE and spot candles on timestamp and derive the straddle series.
+
+    Fill policy: a missing bar becomes a flat bar at the leg's previous close
+    (open = high = low = close), for at most `fill_limit` bars and never across an IST
+    trading-day boundary. Bars where CE or PE is still missing (before a leg's first
+    trade of the day, or after a longer gap) are dropped. Spot gaps beyond the limit
+    leave spot_price and the ratio empty.
+    Straddle high/low are the sums of the leg highs/lows, an upper/lower bound since
+    the legs need not peak in the same minute.
+    """
+    legs = {"ce": ce, "pe": pe}
+    if spot is not None:
+        legs["spot"] = spot
+
+    timestamps = np.unique(np.concatenate([leg["timestamp"].to_numpy(dtype=np.int64) for leg in legs.values()]))
+    days = (timestamps + IST_OFFSET_SECONDS) // DAY_SECONDS
+
+    def align(leg: pd.DataFrame) -> pd.DataFrame:
+        bars = (leg.drop_duplicates("timestamp", keep="last")
+                   .set_index("timestamp")[["open", "high", "low", "close"]]
+                   .astype(float)
+                   .reindex(timestamps))
+        missing = bars["close"].isna().to_numpy()
+        close = bars["close"].groupby(days).ffill(limit=fill_limit)
+        for column in ("open", "high", "low"):
+            bars.loc[missing, column] = close[missing]
+        bars["close"] = close
+        return bars
+
+    aligned = {name: align(leg) for name, leg in legs.items()}
+
+    ce_bars, pe_bars = aligned["ce"], aligned["pe"]
+    keep = (ce_bars["close"].notna() & pe_bars["close"].notna()).to_numpy()
+    straddle = (ce_bars + pe_bars)[keep]
+    spot_close = aligned["spot"]["close"][keep] if spot is not None else pd.Series(np.nan, index=straddle.index)
+
+    series = pd.DataFrame({
+        "timestamp": straddle.index.to_numpy(dtype=np.int64),
+        "ce_price": ce_bars["close"][keep].to_numpy(),
+        "pe_price": pe_bars["close"][keep].to_numpy(),
+        "spot_price": spot_close.to_numpy(),
+        "straddle_open": straddle["open"].to_numpy(),
+        "straddle_high": straddle["high"].to_numpy(),
+        "straddle_low": straddle["low"].to_numpy(),
+        "straddle_price": straddle["close"].to_numpy(),
+    })
+    series["straddle_spot_ratio"] = series["straddle_price"] / series["spot_price"]
+    series["change"] = series["straddle_price"].diff()
+    series["change_percent"] = series["straddle_price"].pct_change() * 100
+    series["date"] = (pd.to_datetime(series["timestamp"], unit="s", utc=True)
+                      .dt.tz_convert("Asia/Kolkata").dt.strftime('%Y-%m-%d %H:%M'))
+    return series[STRADDLE_COLUMNS]
@@ -0,0 +1,53 @@
+from pathlib import Path
+import sys
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+from bar_builder import BarBuilder
+
+START = 1736135100  # 09:15 IST, on a 15-minute boundary
+
+
+def tick(offset, ltp, volume):
+    return {"symbol": "NSE:NIFTY50-INDEX", "timestamp": START + offset, "ltp": ltp, "volume": volume}
+
+
+def test_bars_close_on_bucket_change_with_volume_from_cumulative_deltas():
+    builder = BarBuilder(intervals=["1m", "5m"])
+    assert builder.update(tick(0, 100.0, 1000)) == []
+    assert builder.update(tick(20, 103.0, 1040)) == []
+    assert builder.update(tick(50, 99.0, 1100)) == []
+
+    closed = builder.update(tick(61, 101.0, 1150))
+    assert closed == [{"symbol": "NSE:NIFTY50-INDEX", "interval": "1m", "timestamp": START,
+                       "open": 100.0, "high": 103.0, "low": 99.0, "close": 99.0, "volume": 100}]
+    assert builder.forming("NSE:NIFTY50-INDEX", "1m")["volume"] == 50
+    assert builder.forming("NSE:NIFTY50-INDEX", "5m")["volume"] == 150
+
+    # Bars also close once their interval is over without another tick
+    assert builder.close_due(START + 119) == []
+    due = builder.close_due(START + 300)
+    assert sorted((bar["interval"], bar["open"], bar["close"], bar["volume"]) for bar in due) == [
+        ("1m", 101.0, 101.0, 50), ("5m", 100.0, 101.0, 150)]
+    assert [bar["timestamp"] for bar in builder.bars("NSE:NIFTY50-INDEX", "1m")] == [START, START + 60]
+
+
+def test_late_ticks_never_reopen_a_bucket_or_set_the_close():
+    builder = BarBuilder(intervals=["1m"])
+    builder.update(tick(0, 100.0, 1000))
+    assert [bar["timestamp"] for bar in builder.close_due(START + 60)] == [START]
+
+    # Nothing is forming, so a straggler for the closed minute is dropped
+    assert builder.update(tick(59, 98.0, 1010)) == []
+    assert builder.forming("NSE:NIFTY50-INDEX", "1m") is None
+
+    # A straggler for an earlier minute leaves the forming bar alone
+    builder.update(tick(65, 101.0, 1020))
+    builder.update(tick(58, 97.0, 1015))
+    # An out-of-order tick inside the forming minute widens its range but is not the close
+    builder.update(tick(62, 99.0, 1018))
+    builder.update(tick(70, 102.0, 1030))
+    assert builder.forming("NSE:NIFTY50-INDEX", "1m") == {
+        "symbol": "NSE:NIFTY50-INDEX", "interval": "1m", "timestamp": START + 60,
+        "open": 101.0, "high": 102.0, "low": 99.0, "close": 102.0, "volume": 20}
+    assert [bar["timestamp"] for bar in builder.bars("NSE:NIFTY50-INDEX", "1m")] == [START]
@@ -0,0 +1,94 @@
+import os
+from pathlib import Path
+import sys
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+from fyers_client import FyersClient, REQUEST_TIMEOUT
+
+
+class FakeResponse:
+    status_code = 200
+
+    def json(self):
+        return {"s": "ok", "d": []}
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, headers, timeout=None):
+        self.calls.append((url, headers["Authorization"]))
+        self.timeout = timeout
+        return FakeResponse()
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        self.calls.append((method, url, headers["Authorization"], timeout))
+        return FakeResponse()
+
+
+def test_client_reuses_session_and_swaps_token(tmp_path):
+    token_path = tmp_path / "access_token.txt"
+    token_path.write_text("first-token\n")
+    client = FyersClient("APP-100", token_path, log_path=tmp_path)
+    client.session = FakeSession()
+
+    model = client.get()
+    assert client.get() is model
+
+    model.quotes(data={"symbols": "NSE:NIFTY50-INDEX"})
+    client.set_token("second-token")
+    swapped = client.get()
+    swapped.quotes(data={"symbols": "NSE:NIFTY50-INDEX"})
+
+    assert swapped is not model
+    assert swapped.service is model.service
+    assert [auth for _, auth in client.session.calls] == ["APP-100:first-token", "APP-100:second-token"]
+    assert client.session.calls[0][0].endswith("/quotes?symbols=NSE%3ANIFTY50-INDEX")
+
+
+def test_set_token_ignores_unchanged_token(tmp_path):
+    token_path = tmp_path / "access_token.txt"
+    token_path.write_text("token")
+    client = FyersClient("APP-100", token_path, log_path=tmp_path)
+
+    model = client.get()
+    client.set_token("token")
+    assert client.get() is model
+
+
+def test_client_reloads_token_rewritten_by_another_process(tmp_path):
+    token_path = tmp_path / "access_token.txt"
+    token_path.write_text("first-token")
+    client = FyersClient("APP-100", token_path, log_path=tmp_path)
+    client.session = FakeSession()
+    model = client.get()
+
+    token_path.write_text("second-token")
+    stat = os.stat(token_path)
+    os.utime(token_path, (stat.st_atime, stat.st_mtime + 10))
+    reloaded = client.get()
+    assert reloaded is not model and reloaded.token == "second-token"
+    assert client.get() is reloaded
+
+    # A missing file keeps the last good token
+    token_path.unlink()
+    assert client.get() is reloaded
+
+
+def test_every_call_goes_through_the_session_with_a_timeout(tmp_path):
+    token_path = tmp_path / "access_token.txt"
+    token_path.write_text("token")
+    client = FyersClient("APP-100", token_path, log_path=tmp_path)
+    client.session = FakeSession()
+    model = client.get()
+
+    model.quotes(data={"symbols": "NSE:NIFTY50-INDEX"})
+    assert client.session.timeout == REQUEST_TIMEOUT
+    service = model.service
+    for call, method in ((service.post_call, "POST"), (service.delete_call, "DELETE"),
+                         (service.patch_call, "PATCH")):
+        assert call("/orders/sync", "APP-100:token", {"id": "1"}) == {"s": "ok", "d": []}
+        assert client.session.calls[-1][0] == method
+        assert client.session.calls[-1][-1] == REQUEST_TIMEOUT
@@ -0,0 +1,208 @@
+import asyncio
+import os
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+import main
+from greeks_engine import GreeksEngine
+from greeks import bs_price, greeks, implied_volatility, norm_cdf
+from instrument_master import InstrumentMaster
+from quote_service import QuoteService
+from test_instrument_master import write_master
+from tick_store import TickStore
+
+
+def test_norm_cdf_matches_known_values():
+    assert np.allclose(norm_cdf(np.array([-1.96, 0.0, 1.0])), [0.0249979, 0.5, 0.8413447], atol=2e-7)
+
+
+def test_implied_volatility_recovers_vol_for_a_whole_chain():
+    spot, years, rate = 23400.0, 7 / 365, 0.065
+    strikes = np.arange(21000.0, 25850.0, 50.0)
+    is_call = np.arange(len(strikes)) % 2 == 0
+    true_vol = 0.12 + 0.3 * np.abs(strikes / spot - 1)  # a smile
+    prices = bs_price(spot, strikes, years, rate, true_vol, is_call)
+
+    started = time.perf_counter()
+    iv = implied_volatility(prices, spot, strikes, years, rate, is_call)
+    elapsed = time.perf_counter() - started
+
+    solvable = prices > 0.05  # deep OTM prices carry no volatility information at this precision
+    assert np.allclose(iv[solvable], true_vol[solvable], atol=1e-4)
+    assert elapsed < 0.05
+
+    # Below intrinsic, above the spot, or missing: no solution
+    bad = implied_volatility(np.array([100.0, 30000.0, np.nan]), spot, 23000.0, years, rate, True)
+    assert np.isnan(bad).all()
+
+
+def test_greeks_signs_and_put_call_parity():
+    spot, strike, years, rate, vol = 23400.0, 23400.0, 30 / 365, 0.065, 0.15
+    call = greeks(spot, strike, years, rate, vol, True)
+    put = greeks(spot, strike, years, rate, vol, False)
+
+    assert np.isclose(call["delta"] - put["delta"], 1.0)
+    assert np.isclose(call["gamma"], put["gamma"]) and call["gamma"] > 0
+    assert call["theta"] < 0 and call["vega"] > 0
+    parity = bs_price(spot, strike, years, rate, vol, True) - bs_price(spot, strike, years, rate, vol, False)
+    assert np.isclose(parity, spot - strike * np.exp(-rate * years))
+
+
+# Stored the way the master has them: naive UTC, 10:00 UTC is the 15:30 IST close
+EXPIRY = "2030-01-31 10:00:00"
+NEXT_EXPIRY = "2030-02-07 10:00:00"
+
+
+def write_chain(path: Path):
+    write_master(path, [
+        [f"NSE:NIFTY30JAN{strike}{option_type}", "NIFTY", 11, 10, EXPIRY, float(strike), f"NIFTY{strike}{option_type}"]
+        for strike in (23300, 23400, 23500) for option_type in ("CE", "PE")
+    ] + [
+        ["NSE:NIFTY30FEB23400CE", "NIFTY", 11, 10, NEXT_EXPIRY, 23400.0, "NIFTY23400CE"],
+    ])
+
+
+def test_expiry_day_resolves_to_todays_expiry_with_hours_left(tmp_path):
+    write_chain(tmp_path / "master_file.csv")
+    master = InstrumentMaster(tmp_path / "master_file.csv")
+    eleven_ist = pd.Timestamp("2030-01-31 11:00", tz="Asia/Kolkata").tz_convert("UTC").tz_localize(None)
+
+    assert master.resolve_expiry("NIFTY", now=eleven_ist) == pd.Timestamp(EXPIRY)
+    assert master.resolve_expiry("NIFTY", "2030-01-31") == pd.Timestamp(EXPIRY)
+    assert master.resolve_expiry("NIFTY", "2030-02-01") is None
+    assert np.isclose(master.years_to_expiry(pd.Timestamp(EXPIRY), eleven_ist) * 365 * 24, 4.5)
+    # After the 15:30 IST close the next week's expiry is the nearest
+    after_close = pd.Timestamp("2030-01-31 15:31", tz="Asia/Kolkata").tz_convert("UTC").tz_localize(None)
+    assert master.resolve_expiry("NIFTY", now=after_close) == pd.Timestamp(NEXT_EXPIRY)
+
+
+def test_option_chain_endpoint(tmp_path, monkeypatch):
+    expiry = EXPIRY
+    write_chain(tmp_path / "master_file.csv")
+    years = InstrumentMaster.years_to_expiry(pd.Timestamp(expiry))
+    store = TickStore()
+    store.update("NSE:NIFTY50-INDEX", {"symbol": "NSE:NIFTY50-INDEX", "ltp": 23410.0})
+    for option_type, vol in (("CE", 0.15), ("PE", 0.18)):
+        price = float(bs_price(23410.0, 23400.0, years, main.RISK_FREE_RATE, vol, option_type == "CE"))
+        store.update(f"NSE:NIFTY30JAN23400{option_type}", {"symbol": f"NSE:NIFTY30JAN23400{option_type}", "ltp": price})
+    monkeypatch.setattr(main, "instrument_master", InstrumentMaster(tmp_path / "master_file.csv"))
+    monkeypatch.setattr(main, "tick_store", store)
+    # Legs the feed never ticked are quoted over REST in one batch; only 23500 CE has a quote
+    quoted = float(bs_price(23410.0, 23500.0, years, main.RISK_FREE_RATE, 0.16, True))
+    requested = []
+
+    def fetch(symbols):
+        requested.append(sorted(symbols))
+        return {"NSE:NIFTY30JAN23500CE": {"symbol": "NSE:NIFTY30JAN23500CE", "ltp": quoted}}
+
+    monkeypatch.setattr(main, "quote_service", QuoteService(fetch, lambda symbol: None))
+
+    response = TestClient(main.app).get("/option-chain/NIFTY")
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["expiry"], body["spot"]) == ("2030-01-31", 23410.0)
+    chain = pd.DataFrame(body["data"], columns=body["columns"])
+    assert chain["strike"].tolist() == [23300.0, 23400.0, 23500.0]
+
+    atm = chain.set_index("strike").loc[23400.0]
+    assert np.isclose(atm["ce_iv"], 15.0, atol=0.01) and np.isclose(atm["pe_iv"], 18.0, atol=0.01)
+    assert 0 < atm["ce_delta"] < 1 and -1 < atm["pe_delta"] < 0
+    assert np.isclose(chain.set_index("strike").loc[23500.0, "ce_iv"], 16.0, atol=0.01)
+    assert requested == [[f"NSE:NIFTY30JAN{strike}{option_type}" for strike in (23300, 23500) for option_type in ("CE", "PE")]]
+    # Legs with neither a tick nor a quote have no price, IV or Greeks
+    assert chain[chain["strike"] == 23300.0][["ce_ltp", "ce_iv", "ce_delta"]].isna().all().all()
+
+    assert TestClient(main.app).get("/option-chain/NIFTY", params={"expiry": "2030-02-14"}).status_code == 404
+
+
+def test_greeks_engine_recomputes_only_contracts_that_moved(tmp_path):
+    write_chain(tmp_path / "master_file.csv")
+    published = []
+    engine = GreeksEngine(InstrumentMaster(tmp_path / "master_file.csv"), {"NIFTY": "NSE:NIFTY50-INDEX"},
+                          published.append, price_tolerance=0.5, spot_tolerance=0.001)
+    now = pd.Timestamp("2029-12-31 15:30")
+
+    def tick(symbol, ltp):
+        engine.on_tick({"symbol": symbol, "timestamp": 1, "ltp": ltp})
+
+    tick("NSE:NIFTY50-INDEX", 23400.0)
+    tick("NSE:NIFTY30JAN23400CE", 520.0)
+    tick("NSE:NIFTY30JAN23400PE", 400.0)
+    tick("NSE:NIFTY30JAN23500CE", 470.0)
+    tick("NSE:NIFTYBANK-INDEX", 50000.0)  # not an option, not a tracked index
+    first = engine.flush(now)
+    assert sorted(update["symbol"] for update in first) == [
+        "GREEKS:NSE:NIFTY30JAN23400CE", "GREEKS:NSE:NIFTY30JAN23400PE", "GREEKS:NSE:NIFTY30JAN23500CE"]
+    atm_call = next(update for update in first if update["symbol"] == "GREEKS:NSE:NIFTY30JAN23400CE")
+    assert 5 < atm_call["iv"] < 50 and 0 < atm_call["delta"] < 1
+
+    # Moves inside both tolerances recompute nothing
+    tick("NSE:NIFTY30JAN23400CE", 520.3)
+    tick("NSE:NIFTY50-INDEX", 23410.0)
+    assert engine.flush(now) == []
+
+    tick("NSE:NIFTY30JAN23400PE", 401.0)
+    assert [update["symbol"] for update in engine.flush(now)] == ["GREEKS:NSE:NIFTY30JAN23400PE"]
+
+    # A spot move past the tolerance dirties the whole chain
+    tick("NSE:NIFTY50-INDEX", 23450.0)
+    assert len(engine.flush(now)) == 3
+    assert engine.metrics() == {"contracts": 3, "flushes": 3, "recomputed": 7}
+    assert [len(updates) for updates in published] == [3, 1, 3]
+
+
+def test_greeks_engine_picks_up_contracts_listed_after_a_master_reload(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_chain(path)
+    engine = GreeksEngine(InstrumentMaster(path), {"NIFTY": "NSE:NIFTY50-INDEX"}, lambda updates: None)
+    listed_later = "NSE:NIFTY30JAN23600CE"
+
+    engine.on_tick({"symbol": "NSE:NIFTY50-INDEX", "timestamp": 1, "ltp": 23400.0})
+    engine.on_tick({"symbol": listed_later, "timestamp": 1, "ltp": 300.0})
+    assert engine.metrics()["contracts"] == 0
+
+    write_master(path, [
+        [listed_later, "NIFTY", 11, 10, EXPIRY, 23600.0, "NIFTY23600CE"],
+    ])
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    engine.on_tick({"symbol": listed_later, "timestamp": 2, "ltp": 301.0})
+    assert engine.metrics()["contracts"] == 1
+    assert [update["symbol"] for update in engine.flush(pd.Timestamp("2029-12-31 10:00"))] == ["GREEKS:" + listed_later]
+
+
+def test_greeks_engine_batches_ticks_into_one_flush_per_loop_cycle(tmp_path):
+    write_chain(tmp_path / "master_file.csv")
+    published = []
+    engine = GreeksEngine(InstrumentMaster(tmp_path / "master_file.csv"), {"NIFTY": "NSE:NIFTY50-INDEX"},
+                          published.append)
+
+    async def scenario():
+        engine.start(asyncio.get_running_loop())
+        engine.on_tick({"symbol": "NSE:NIFTY50-INDEX", "ltp": 23400.0})
+        for strike in (23300, 23400, 23500):
+            engine.on_tick({"symbol": f"NSE:NIFTY30JAN{strike}CE", "ltp": 600.0 - (strike - 23300) / 2})
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert [len(updates) for updates in published] == [3]
+
+
+def test_greeks_engine_uses_hours_left_on_expiry_day(tmp_path):
+    write_chain(tmp_path / "master_file.csv")
+    engine = GreeksEngine(InstrumentMaster(tmp_path / "master_file.csv"), {"NIFTY": "NSE:NIFTY50-INDEX"},
+                          lambda updates: None)
+    eleven_ist = pd.Timestamp("2030-01-31 11:00", tz="Asia/Kolkata").tz_convert("UTC").tz_localize(None)
+    price = float(bs_price(23410.0, 23400.0, 4.5 / (365 * 24), main.RISK_FREE_RATE, 0.15, True))
+
+    engine.on_tick({"symbol": "NSE:NIFTY50-INDEX", "ltp": 23410.0})
+    engine.on_tick({"symbol": "NSE:NIFTY30JAN23400CE", "ltp": price})
+    update, = engine.flush(eleven_ist)
+    assert np.isclose(update["iv"], 15.0, atol=0.01)
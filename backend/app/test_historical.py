@@ -0,0 +1,215 @@
+from pathlib import Path
+import sys
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+import main
+from candle_store import CandleStore
+from history_planner import RateLimiter, plan_ranges
+from straddle_series import build_straddle_series
+from instrument_master import InstrumentMaster
+from test_instrument_master import MASTER_ROWS, write_master
+
+def recent_minutes(count):
+    """Epoch seconds of the last `count` whole minutes"""
+    last = int(time.time()) // 60 * 60
+    return [last - 60 * i for i in reversed(range(count))]
+
+
+class FakeHistoryModel:
+    """Stands in for FyersModel.history with a fixed round-trip delay"""
+
+    def __init__(self, delay=0.0, prices=None, bars=None):
+        self.delay = delay
+        self.prices = prices or {}
+        self.bars = bars if bars is not None else recent_minutes(5)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def history(self, data=None):
+        with self._lock:
+            self.requests.append(dict(data))
+        time.sleep(self.delay)
+        price = self.prices.get(data["symbol"], 100.0)
+        range_from, range_to = int(data["range_from"]), int(data["range_to"])
+        candles = [
+            [ts, price, price + 1, price - 1, price + i, 10]
+            for i, ts in enumerate(self.bars) if range_from <= ts <= range_to
+        ]
+        return {"s": "ok", "candles": candles}
+
+
+class FakeClient:
+    def __init__(self, model):
+        self.model = model
+
+    def get(self):
+        return self.model
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    master_path = tmp_path / "master_file.csv"
+    write_master(master_path, MASTER_ROWS)
+    monkeypatch.setattr(main, "instrument_master", InstrumentMaster(master_path))
+    monkeypatch.setattr(main, "candle_store", CandleStore(tmp_path / "candles"))
+
+    def install(model):
+        monkeypatch.setattr(main, "fyers_client", FakeClient(model))
+        return model
+
+    return install
+
+
+def test_straddle_legs_are_fetched_concurrently(backend):
+    model = backend(FakeHistoryModel(delay=0.3))
+
+    started = time.perf_counter()
+    result = main.get_historical_straddle("NIFTY", "23400")
+    elapsed = time.perf_counter() - started
+
+    # Three sequential round trips would take at least 0.9s
+    assert elapsed < 0.6
+    assert sorted(request["symbol"] for request in model.requests) == [
+        "NSE:NIFTY2511623400CE", "NSE:NIFTY2511623400PE", "NSE:NIFTY50-INDEX"
+    ]
+    assert result["spot_data"]["symbol"] == "NSE:NIFTY50-INDEX"
+    assert len(result["spot_data"]["data"]) == 5
+
+
+def test_repeat_requests_only_fetch_the_missing_tail(backend):
+    bars = recent_minutes(30)
+    model = backend(FakeHistoryModel(bars=bars[:20]))
+
+    first = main.get_historical_data("NSE:NIFTY50-INDEX", days_back=5)
+    assert first["timestamp"].tolist() == bars[:20]
+
+    model.bars = bars
+    second = main.get_historical_data("NSE:NIFTY50-INDEX", days_back=5)
+
+    assert second["timestamp"].tolist() == bars
+    # The second call resumes from the last stored bar instead of the window start
+    assert int(model.requests[1]["range_from"]) == bars[19]
+    assert int(model.requests[0]["range_from"]) < bars[0]
+
+
+def test_plan_ranges_splits_long_windows():
+    day = 86400
+    ranges = plan_ranges(0, 250 * day, resolution="1")
+
+    assert ranges == [(0, 100 * day - 1), (100 * day, 200 * day - 1), (200 * day, 250 * day)]
+    assert plan_ranges(0, 300 * day, resolution="D") == [(0, 300 * day)]
+
+
+def test_long_window_is_fetched_in_parallel_chunks(backend):
+    bars = recent_minutes(3)
+    model = backend(FakeHistoryModel(delay=0.2, bars=bars))
+
+    started = time.perf_counter()
+    candles = main.fetch_history("NSE:NIFTY50-INDEX", bars[-1] - 300 * 86400, bars[-1])
+    elapsed = time.perf_counter() - started
+
+    assert len(model.requests) == 4
+    assert elapsed < 0.6
+    assert candles["timestamp"].tolist() == bars
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(rate=20, burst=1)
+
+    started = time.perf_counter()
+    for _ in range(5):
+        limiter.acquire()
+
+    assert time.perf_counter() - started >= 0.19
+
+
+def candles(rows):
+    return pd.DataFrame(rows, columns=["timestamp", "open", "high", "low", "close", "volume"])
+
+
+def test_straddle_series_aligns_legs_with_bounded_fill():
+    ce = candles([[60, 10, 12, 9, 11, 1], [120, 11, 13, 10, 12, 1], [180, 12, 12, 12, 12, 1]])
+    pe = candles([[0, 20, 20, 20, 20, 1], [60, 21, 22, 20, 21, 1], [180, 19, 20, 18, 19, 1]])
+    spot = candles([[60, 100, 100, 100, 100, 0], [120, 100, 100, 100, 100, 0]])
+
+    series = build_straddle_series(ce, pe, spot, fill_limit=1)
+
+    # t=0 has no CE bar yet; t=120 carries PE forward one bar, flat at its close
+    assert series["timestamp"].tolist() == [60, 120, 180]
+    assert series["straddle_price"].tolist() == [32.0, 33.0, 31.0]
+    assert series["straddle_high"].tolist() == [34.0, 34.0, 32.0]
+    assert series["straddle_low"].tolist() == [29.0, 31.0, 30.0]
+    assert series["straddle_spot_ratio"].tolist()[:2] == [0.32, 0.33]
+    assert series["change"].tolist()[1:] == [1.0, -2.0]
+    assert series["spot_price"].tolist()[2] == 100.0
+
+
+def test_straddle_series_fill_stops_at_the_trading_day():
+    # 15:29 IST on one day, then 09:15 IST the next; PE only trades the first minute
+    close = 1736157540
+    open_next = close + 17 * 3600 + 46 * 60
+    ce = candles([[close, 10, 12, 9, 11, 1], [open_next, 11, 13, 10, 12, 1]])
+    pe = candles([[close, 20, 22, 19, 21, 1]])
+
+    series = build_straddle_series(ce, pe, fill_limit=5)
+    assert series["timestamp"].tolist() == [close]
+    assert series["date"].tolist() == ["2025-01-06 15:29"]
+
+
+def test_historical_straddle_endpoint_returns_series(backend):
+    backend(FakeHistoryModel(prices={"NSE:NIFTY2511623400CE": 100.0, "NSE:NIFTY2511623400PE": 50.0}))
+
+    response = TestClient(main.app).get("/historical_straddle/NIFTY/23400")
+    assert response.status_code == 200
+    straddle = response.json()["straddle"]
+    rows = [dict(zip(straddle["columns"], row)) for row in straddle["data"]]
+
+    assert len(rows) == 5
+    assert rows[0]["straddle_price"] == rows[0]["ce_price"] + rows[0]["pe_price"]
+    assert rows[0]["change"] is None
+
+
+def test_historical_straddle_columnar_and_arrow_formats(backend):
+    backend(FakeHistoryModel(prices={"NSE:NIFTY2511623400CE": 100.0, "NSE:NIFTY2511623400PE": 50.0}))
+    client = TestClient(main.app)
+
+    columnar = client.get("/historical_straddle/NIFTY/23400", params={"format": "columnar"}).json()
+    assert columnar["ce_data"]["symbol"] == "NSE:NIFTY2511623400CE"
+    assert all(isinstance(ts, int) for ts in columnar["ce_data"]["timestamp"])
+    assert len(columnar["straddle"]["straddle_price"]) == 5
+    assert columnar["straddle"]["change"][0] is None
+    assert "date" not in columnar["straddle"]
+
+    response = client.get("/historical_straddle/NIFTY/23400",
+                          headers={"Accept": main.ARROW_STREAM_MEDIA_TYPE})
+    assert response.headers["content-type"] == main.ARROW_STREAM_MEDIA_TYPE
+    body = pa.BufferReader(response.content)
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.column("straddle_price").to_pylist() == columnar["straddle"]["straddle_price"]
+    assert table.schema.metadata[b"ce_data_symbol"] == b"NSE:NIFTY2511623400CE"
+    # The leg candles follow as one stream each
+    for leg in main.LEG_KEYS:
+        candles = pa.ipc.open_stream(body).read_all()
+        assert candles.schema.metadata[b"leg"] == leg.encode()
+        assert candles.schema.metadata[b"symbol"].decode() == columnar[leg]["symbol"]
+        assert candles.to_pydict() == {column: columnar[leg][column] for column in candles.column_names}
+    assert body.tell() == len(response.content)
+
+    assert client.get("/historical_straddle/NIFTY/23400", params={"format": "xml"}).status_code == 400
+
+
+def test_historical_straddle_rejects_out_of_range_days_back(backend):
+    model = backend(FakeHistoryModel())
+    client = TestClient(main.app)
+    for days_back in (0, 36500, 10**6):
+        response = client.get("/historical_straddle/NIFTY/23400", params={"days_back": days_back})
+        assert response.status_code == 422
+    assert model.requests == []
@@ -0,0 +1,241 @@
+import json
+import os
+from pathlib import Path
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+from instrument_master import (
+    InstrumentMaster, iter_json_object_items, read_master_snapshot, snapshot_path_for, source_fingerprint,
+    write_master_snapshot
+)
+
+MASTER_ROWS = [
+    ["NSE:NIFTY2511623400CE", "NIFTY", 11, 10, "2025-01-16 10:00:00", 23400.0, "NIFTY2511623400CE"],
+    ["NSE:NIFTY2511623400PE", "NIFTY", 11, 10, "2025-01-16 10:00:00", 23400.0, "NIFTY2511623400PE"],
+    ["NSE:NIFTY2511623300CE", "NIFTY", 11, 10, "2025-01-16 10:00:00", 23300.0, "NIFTY2511623300CE"],
+    ["NSE:NIFTY2512323400CE", "NIFTY", 11, 10, "2025-01-23 10:00:00", 23400.0, "NIFTY2512323400CE"],
+    ["NSE:NIFTY2512323400PE", "NIFTY", 11, 10, "2025-01-23 10:00:00", 23400.0, "NIFTY2512323400PE"],
+    ["NSE:NIFTY25JANFUT", "NIFTY", 11, 10, "2025-01-30 10:00:00", -1.0, "NIFTY25JANFUT"],
+    ["NSE:BANKNIFTY2512948000CE", "BANKNIFTY", 11, 10, "2025-01-29 10:00:00", 48000.0, "BANKNIFTY2512948000CE"],
+]
+COLUMNS = ["symbol", "exSymbol", "segment", "exchange", "expiryDate", "strikePrice", "exSymName"]
+
+
+def write_master(path: Path, rows):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+
+
+def test_strikes_and_expiries(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    master = InstrumentMaster(path)
+
+    assert master.strikes("NIFTY").tolist() == [23300.0, 23400.0]
+    assert master.expiries("NIFTY") == [pd.Timestamp("2025-01-16 10:00"), pd.Timestamp("2025-01-23 10:00")]
+    assert master.strikes("NIFTY", "2025-01-23 10:00").tolist() == [23400.0]
+    assert master.strikes("UNKNOWN").size == 0
+
+
+def test_straddle_uses_exact_underlying_and_nearest_expiry(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    master = InstrumentMaster(path)
+
+    assert master.straddle("NIFTY", 23400) == (
+        pd.Timestamp("2025-01-16 10:00"), "NSE:NIFTY2511623400CE", "NSE:NIFTY2511623400PE"
+    )
+    # Only the CE leg is listed at 23300
+    assert master.straddle("NIFTY", 23300) is None
+    assert master.contract("BANKNIFTY", "2025-01-29 10:00", 48000, "CE") == "NSE:BANKNIFTY2512948000CE"
+
+
+def test_contracts_resolve_both_ways_from_the_snapshot_alone(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    InstrumentMaster(path).refresh()
+    path.unlink()
+    master = InstrumentMaster(path)
+
+    for symbol, ex_symbol, _, _, expiry, strike, _ in MASTER_ROWS:
+        if symbol.endswith(("CE", "PE")):
+            described = (ex_symbol, pd.Timestamp(expiry), strike, symbol[-2:])
+            assert master.describe(symbol) == described
+            assert master.contract(*described) == symbol
+    assert master.describe("NSE:NIFTY25JANFUT") is None
+    assert master.contract("NIFTY", "2025-01-16 10:00", 23400.5, "CE") is None
+    assert master.contract("NIFTY", "2025-01-16 10:00", 23400, "FUT") is None
+    assert master.contract("SENSEX", "2025-01-16 10:00", 23400, "CE") is None
+
+
+def test_unusable_snapshot_without_csv_raises_file_not_found(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    InstrumentMaster(path).refresh()
+    path.unlink()
+    snapshot = snapshot_path_for(path)
+    table = pa.ipc.open_file(pa.memory_map(str(snapshot))).read_all()
+    with pa.OSFile(str(snapshot), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema.with_metadata({"snapshot_version": "0"})) as writer:
+            writer.write_table(table)
+
+    with pytest.raises(FileNotFoundError, match="unusable"):
+        InstrumentMaster(path).expiries("NIFTY")
+
+
+def test_snapshot_writes_leave_no_temp_files_behind(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    frame = pd.read_csv(path)
+    for _ in range(2):
+        write_master_snapshot(frame, snapshot_path_for(path), source_fingerprint(path))
+    assert sorted(child.name for child in tmp_path.iterdir()) == ["master_file.arrow", "master_file.csv"]
+
+
+def test_reload_publishes_a_new_index_in_one_swap(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    master = InstrumentMaster(path)
+    master.refresh()
+    before = master._index
+
+    write_master(path, MASTER_ROWS[:2])
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert master.refresh()
+    # The old index is left whole for readers still holding it
+    assert master._index is not before and master.version == before.version + 1
+    assert before.expiries["NIFTY"] == [pd.Timestamp("2025-01-16 10:00"), pd.Timestamp("2025-01-23 10:00")]
+    assert master.expiries("NIFTY") == [pd.Timestamp("2025-01-16 10:00")]
+
+
+def test_reloads_only_when_mtime_changes(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    master = InstrumentMaster(path)
+
+    assert master.refresh()
+    assert not master.refresh()
+
+    write_master(path, MASTER_ROWS[:2])
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    assert master.refresh()
+    assert master.expiries("NIFTY") == [pd.Timestamp("2025-01-16 10:00")]
+
+
+def test_snapshot_is_typed_and_rebuilt_when_stale(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    InstrumentMaster(path).refresh()
+
+    snapshot = read_master_snapshot(snapshot_path_for(path), source_fingerprint(path))
+    assert str(snapshot['exSymbol'].dtype) == "category"
+    assert snapshot['strikePrice'].dtype == "int32"
+    assert snapshot['expiryDate'].dtype.kind == "M"
+
+    write_master(path, MASTER_ROWS[:2])
+    assert read_master_snapshot(snapshot_path_for(path), source_fingerprint(path)) is None
+
+    master = InstrumentMaster(path)
+    assert master.strikes("NIFTY").tolist() == [23400.0]
+    assert read_master_snapshot(snapshot_path_for(path), source_fingerprint(path)) is not None
+
+
+def fo_record(ex_symbol, expiry, strike, name):
+    return {"exSymbol": ex_symbol, "segment": 11, "exchange": 10, "expiryDate": str(expiry),
+            "strikePrice": strike, "exSymName": name, "lotSize": 75, "tickSize": 0.05}
+
+
+def write_fixture(path: Path, records) -> Path:
+    path.write_text(json.dumps(records, indent=1))
+    return path
+
+
+def test_iter_json_object_items_across_chunk_boundaries():
+    payload = json.dumps({"A": {"x": [1, 2, {"y": "}"}]}, "B": 12345, "Cé": "v"}).encode()
+    chunks = [payload[i:i + 3] for i in range(0, len(payload), 3)]
+
+    assert list(iter_json_object_items(chunks)) == [
+        ("A", {"x": [1, 2, {"y": "}"}]}), ("B", 12345), ("Cé", "v")
+    ]
+
+
+def test_streaming_download_filters_and_diffs(tmp_path):
+    from Fyers_login import download_master_instruments
+
+    jan16, jan23 = 1737021600, 1737626400
+    nse = write_fixture(tmp_path / "NSE_FO.json", {
+        "NSE:NIFTY2511623400CE": fo_record("NIFTY", jan16, 23400.0, "NIFTY2511623400CE"),
+        "NSE:NIFTY2511623400PE": fo_record("NIFTY", jan16, 23400.0, "NIFTY2511623400PE"),
+        "NSE:RELIANCE25JANFUT": fo_record("RELIANCE", jan16, -1.0, "RELIANCE25JANFUT"),
+    })
+    bse = write_fixture(tmp_path / "BSE_FO.json", {
+        "BSE:SENSEX2512180900CE": fo_record("SENSEX", jan16, 80900.0, "SENSEX2512180900CE"),
+    })
+    output_path = tmp_path / "master_file.csv"
+
+    assert download_master_instruments({"NSE_FO": nse, "BSE_FO": bse}, output_path) is None
+    first = pd.read_csv(output_path)
+    assert sorted(first['symbol']) == [
+        "BSE:SENSEX2512180900CE", "NSE:NIFTY2511623400CE", "NSE:NIFTY2511623400PE"
+    ]
+    assert first['expiryDate'].iloc[0] == "2025-01-16 10:00:00"
+
+    nse = write_fixture(tmp_path / "NSE_FO.json", {
+        "NSE:NIFTY2511623400PE": fo_record("NIFTY", jan23, 23400.0, "NIFTY2511623400PE"),
+        "NSE:NIFTY2512323400CE": fo_record("NIFTY", jan23, 23400.0, "NIFTY2512323400CE"),
+    })
+    diff = download_master_instruments({"NSE_FO": nse, "BSE_FO": bse}, output_path)
+
+    assert diff == {
+        "added": ["NSE:NIFTY2512323400CE"],
+        "expired": ["NSE:NIFTY2511623400CE"],
+        "changed": ["NSE:NIFTY2511623400PE"],
+    }
+    assert InstrumentMaster(output_path).straddle("NIFTY", 23400) == (
+        pd.Timestamp("2025-01-23 10:00"), "NSE:NIFTY2512323400CE", "NSE:NIFTY2511623400PE"
+    )
+
+
+def test_nearest_strikes_window_by_binary_search(tmp_path):
+    path = tmp_path / "master_file.csv"
+    # Written out of order on purpose
+    rows = [[f"NSE:NIFTY25116{strike}CE", "NIFTY", 11, 10, "2025-01-16 10:00:00", float(strike), "x"]
+            for strike in (23500, 23000, 23400, 23100, 23300, 23200)]
+    rows.append(["NSE:NIFTY2512323600CE", "NIFTY", 11, 10, "2025-01-23 10:00:00", 23600.0, "x"])
+    write_master(path, rows)
+    master = InstrumentMaster(path)
+
+    strikes, atm = master.nearest_strikes("NIFTY", 23262, width=1)
+    assert (strikes.tolist(), atm) == ([23200.0, 23300.0, 23400.0], 23300.0)
+    # Ties round down, and the window is clipped at both ends
+    assert master.nearest_strikes("NIFTY", 23250, width=1)[1] == 23200.0
+    assert master.nearest_strikes("NIFTY", 22000, width=2)[0].tolist() == [23000.0, 23100.0, 23200.0]
+    assert master.nearest_strikes("NIFTY", 99999, width=1)[0].tolist() == [23500.0, 23600.0]
+    assert master.nearest_strikes("NIFTY", 99999, width=1, expiry="2025-01-16 10:00")[1] == 23500.0
+    strikes, atm = master.nearest_strikes("UNKNOWN", 23000)
+    assert (strikes.size, atm) == (0, None)
+
+
+def test_index_strikes_endpoint_window_and_expiry(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    monkeypatch.setattr(main, "instrument_master", InstrumentMaster(path))
+    monkeypatch.setattr(main, "get_current_index_price", lambda index: 23390.0)
+    client = TestClient(main.app)
+
+    body = client.get("/index-strikes/NIFTY", params={"window": 0}).json()
+    assert (body["strikes"], body["default_strike"], body["expiry"]) == ([23400.0], 23400.0, None)
+    body = client.get("/index-strikes/NIFTY", params={"expiry": "2025-01-23"}).json()
+    assert (body["strikes"], body["expiry"]) == ([23400.0], "2025-01-23")
+    assert client.get("/index-strikes/NIFTY", params={"expiry": "2025-02-06"}).status_code == 404
+    assert client.get("/index-strikes/NIFTY", params={"window": -1}).status_code == 422
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+from quote_service import QuoteService
+
+
+class SlowQuotes:
+    """Counts REST calls; each takes `delay` seconds"""
+
+    def __init__(self, delay=0.1, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, symbols):
+        with self.lock:
+            self.calls.append(symbols)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {symbol: {"symbol": symbol, "ltp": 23400.0, "timestamp": int(time.time())} for symbol in symbols}
+
+
+def test_fresh_live_tick_skips_rest():
+    rest = SlowQuotes()
+    live = {"NSE:NIFTY50-INDEX": {"symbol": "NSE:NIFTY50-INDEX", "ltp": 23512.5, "timestamp": time.time()}}
+    service = QuoteService(rest, live.get)
+
+    assert service.quote("NSE:NIFTY50-INDEX")["source"] == "live"
+    assert rest.calls == []
+
+    live["NSE:NIFTY50-INDEX"]["timestamp"] -= 60  # feed went quiet
+    assert service.quote("NSE:NIFTY50-INDEX")["source"] == "rest"
+    assert rest.calls == [["NSE:NIFTY50-INDEX"]]
+
+
+def test_concurrent_misses_share_one_rest_call_per_ttl():
+    rest = SlowQuotes(delay=0.2)
+    service = QuoteService(rest, lambda symbol: None, ttl=0.5)
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        quotes = list(pool.map(service.quote, ["NSE:NIFTY50-INDEX"] * 20))
+    assert len(rest.calls) == 1
+    assert {quote["ltp"] for quote in quotes} == {23400.0}
+
+    service.quote("NSE:NIFTY50-INDEX")
+    assert len(rest.calls) == 1  # still within the TTL
+    time.sleep(0.5)
+    service.quote("NSE:NIFTY50-INDEX")
+    assert len(rest.calls) == 2
+
+
+def test_rest_failure_reaches_every_waiter_and_is_not_cached():
+    rest = SlowQuotes(delay=0.2, error=RuntimeError("rate limited"))
+    service = QuoteService(rest, lambda symbol: None)
+
+    def quote():
+        with pytest.raises(RuntimeError):
+            service.quote("NSE:NIFTY50-INDEX")
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        list(pool.map(lambda _: quote(), range(5)))
+    assert len(rest.calls) == 1
+
+    rest.error = None
+    assert service.quote("NSE:NIFTY50-INDEX")["ltp"] == 23400.0
+
+
+def test_quotes_mix_live_cache_and_batched_rest(monkeypatch):
+    import main
+
+    rest = SlowQuotes(delay=0)
+    live = {"NSE:NIFTY50-INDEX": {"symbol": "NSE:NIFTY50-INDEX", "ltp": 23512.5, "timestamp": time.time()}}
+    service = QuoteService(rest, live.get, batch_size=2)
+    monkeypatch.setattr(main, "quote_service", service)
+    options = [f"NSE:NIFTY25116{strike}CE" for strike in (23300, 23400, 23500)]
+
+    client = TestClient(main.app)
+    response = client.get("/quotes", params={"symbols": ",".join(["NIFTY"] + options)})
+    assert response.status_code == 200
+    quotes = response.json()["quotes"]
+    assert list(quotes) == ["NIFTY"] + options
+    assert quotes["NIFTY"]["source"] == "live"
+    assert {quotes[option]["source"] for option in options} == {"rest"}
+    # Three misses, chunked two per upstream call
+    assert rest.calls == [options[:2], options[2:]]
+
+    # Cached within the TTL: no new upstream call
+    client.get("/quotes", params={"symbols": options[0]})
+    assert len(rest.calls) == 2
+    assert client.get("/quotes", params={"symbols": " , "}).status_code == 400
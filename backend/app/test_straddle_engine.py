@@ -0,0 +1,84 @@
+from pathlib import Path
+import sys
+
+import pandas as pd
+import pytest
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+import main
+from instrument_master import InstrumentMaster
+from straddle_engine import StraddleEngine
+from tick_journal import TickJournal
+from tick_store import TickStore
+from test_instrument_master import MASTER_ROWS, write_master
+from test_websocket import app_client  # noqa: F401
+
+CE, PE = "NSE:NIFTY2511623400CE", "NSE:NIFTY2511623400PE"
+KEY = "STRADDLE:NIFTY:2025-01-16:23400"
+# Naive UTC, a few days before the master's first expiry
+NOW = pd.Timestamp("2025-01-10 04:00")
+
+
+@pytest.fixture
+def master(tmp_path):
+    path = tmp_path / "master_file.csv"
+    write_master(path, MASTER_ROWS)
+    return InstrumentMaster(path)
+
+
+def tick(symbol, timestamp, ltp):
+    return {"symbol": symbol, "timestamp": timestamp, "ltp": ltp}
+
+
+def test_engine_combines_leg_ticks_and_refcounts_registrations(master):
+    engine = StraddleEngine(master)
+    straddle, legs = engine.register("NIFTY", 23400, now=NOW)
+    assert (straddle.key, legs) == (KEY, [CE, PE])
+    assert engine.register("NIFTY", 23400, "2025-01-16")[1] == []
+    with pytest.raises(LookupError):
+        engine.register("NIFTY", 23300, now=NOW)
+
+    # Without an expiry, one that has already passed is never picked
+    after_first = pd.Timestamp("2025-01-16 10:01")
+    assert engine.register("NIFTY", 23400, now=after_first)[0].key == "STRADDLE:NIFTY:2025-01-23:23400"
+    engine.unregister("STRADDLE:NIFTY:2025-01-23:23400")
+    with pytest.raises(LookupError, match="No unexpired NIFTY options"):
+        engine.register("NIFTY", 23400, now=pd.Timestamp("2025-02-01"))
+
+    assert engine.on_tick(tick(CE, 100, 120.5)) is None  # PE has no price yet
+    assert engine.on_tick(tick("NSE:NIFTY50-INDEX", 100, 23400.0)) is None
+    update = engine.on_tick(tick(PE, 101, 99.25))
+    assert (update["symbol"], update["timestamp"], update["straddle_price"]) == (KEY, 101, 219.75)
+    assert engine.on_tick(tick(CE, 102, 121.0))["straddle_price"] == 220.25
+
+    assert engine.unregister(KEY) == []
+    assert engine.unregister(KEY) == [CE, PE]
+    assert engine.on_tick(tick(CE, 103, 122.0)) is None
+
+
+def test_registered_straddle_streams_over_ws(app_client, master, monkeypatch, tmp_path):  # noqa: F811
+    monkeypatch.setattr(main, "straddle_engine", StraddleEngine(master))
+    monkeypatch.setattr(main, "tick_journal", TickJournal(tmp_path / "ticks"))
+    monkeypatch.setattr(main, "tick_store", TickStore())
+    upstream = []
+    monkeypatch.setattr(main.manager, "_upstream_subscribe", lambda symbols: upstream.append(symbols))
+
+    response = app_client.post("/straddles", json={"index": "NIFTY", "strike": 23400, "expiry": "2025-01-16"})
+    assert response.status_code == 200
+    assert response.json()["symbol"] == KEY
+    assert app_client.post("/straddles", json={"index": "NIFTY", "strike": 23300, "expiry": "2025-01-16"}).status_code == 404
+    # Every expiry in the fixture master has passed, so there is nothing live to default to
+    missing = app_client.post("/straddles", json={"index": "NIFTY", "strike": 23400})
+    assert missing.status_code == 404 and missing.json()["detail"] == "No unexpired NIFTY options"
+
+    with app_client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"action": "subscribe", "symbols": [KEY]})
+        assert websocket.receive_json()["type"] == "subscribed"
+        main.on_message({"symbol": CE, "exch_feed_time": 100, "ltp": 120.5})
+        main.on_message({"symbol": PE, "exch_feed_time": 101, "ltp": 99.5})
+        update = websocket.receive_json()
+        assert (update["symbol"], update["straddle_price"]) == (KEY, 220.0)
+
+    assert app_client.delete(f"/straddles/{KEY}").json()["released"] == [CE, PE]
+    assert app_client.get("/straddles").json() == {"straddles": []}
@@ -0,0 +1,39 @@
+from pathlib import Path
+import sys
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+from tick_journal import TickJournal
+
+
+def tick(symbol, timestamp, ltp):
+    return {"symbol": symbol, "timestamp": timestamp, "ltp": ltp, "volume": timestamp}
+
+
+def test_journal_records_every_tick_and_rolls_segments(tmp_path):
+    journal = TickJournal(tmp_path, max_ticks=3)
+    journal.start()
+    for i in range(7):
+        journal.record(tick("NSE:NIFTY50-INDEX" if i % 2 else "NSE:NIFTYBANK-INDEX", 1000 + i, 100.0 + i))
+    journal.close()
+
+    # Nothing is left in the active journal after close, everything is in segments
+    assert not journal.wal_path.exists()
+    assert len(journal.segments()) == 3
+    assert journal.read()["timestamp"].tolist() == list(range(1000, 1007))
+    assert journal.read("NSE:NIFTY50-INDEX", start=1002)["ltp"].tolist() == [103.0, 105.0]
+    assert journal.last("NSE:NIFTYBANK-INDEX")["ltp"] == 106.0
+
+
+def test_journal_left_by_a_crash_is_rolled_on_start(tmp_path):
+    (tmp_path / "active.jsonl").write_text(
+        '{"symbol":"NSE:NIFTY50-INDEX","timestamp":1000,"ltp":1.5,"volume":1}\n'
+        '{"symbol":"NSE:NIFTY50-INDEX","timestamp":1001,"ltp":2.'
+    )
+    journal = TickJournal(tmp_path)
+    journal.start()
+    journal.record(tick("NSE:NIFTY50-INDEX", 1002, 3.5))
+    journal.close()
+
+    assert journal.read()["ltp"].tolist() == [1.5, 3.5]
+    assert [segment.stem.split("_")[1:3] for segment in journal.segments()] == [["1000", "1000"], ["1002", "1002"]]
@@ -0,0 +1,30 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+from tick_store import TickStore
+
+
+def tick(timestamp, ltp):
+    return {"symbol": "NSE:NIFTY50-INDEX", "timestamp": timestamp, "ltp": ltp, "open": 100.0,
+            "high": 110.0, "low": 90.0, "volume": timestamp * 10}
+
+
+def test_ring_keeps_newest_ticks_in_order_and_latest_view():
+    store = TickStore(capacity=4)
+    assert store.latest("NSE:NIFTY50-INDEX") is None
+    assert len(store.last("NSE:NIFTY50-INDEX")) == 0
+
+    for i in range(1, 7):
+        store.update("NSE:NIFTY50-INDEX", tick(i, 100.0 + i))
+
+    ticks = store.last("NSE:NIFTY50-INDEX")
+    assert ticks["timestamp"].tolist() == [3, 4, 5, 6]
+    assert ticks["volume"].tolist() == [30, 40, 50, 60]
+    assert store.last("NSE:NIFTY50-INDEX", 2)["ltp"].tolist() == [105.0, 106.0]
+    assert float(np.mean(store.last("NSE:NIFTY50-INDEX")["ltp"])) == 104.5
+    assert store.latest("NSE:NIFTY50-INDEX") == tick(6, 106.0)
+    assert store.ltp("NSE:NIFTY50-INDEX") == 106.0
@@ -0,0 +1,311 @@
+import asyncio
+import json
+from pathlib import Path
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add parent directory to Python path for imports
+sys.path.append(str(Path(__file__).parent))
+import main
+from connection_manager import ConnectionManager, SlowConsumerPolicy, LAGGING_CLOSE_CODE
+
+
+class FakeWebSocket:
+    """Records what the manager sends; `delay` simulates a slow link"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=None):
+        self.closed = code
+
+
+def tick(symbol, ltp):
+    return {"symbol": symbol, "ltp": ltp}
+
+
+@pytest.fixture
+def app_client(monkeypatch):
+    """TestClient running the app lifespan on one loop, with the Fyers feed stubbed out"""
+    async def initialize_websocket():
+        pass
+    monkeypatch.setattr(main, "initialize_websocket", initialize_websocket)
+    monkeypatch.setattr(main, "ensure_valid_token", lambda: None)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_slow_client_does_not_block_fast_client():
+    async def scenario():
+        manager = ConnectionManager()
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=5)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        for i in range(10):
+            manager.broadcast(tick("NSE:NIFTY50-INDEX", i))
+        await asyncio.sleep(0.05)
+
+        assert [message["ltp"] for message in fast.sent] == list(range(10))
+        assert slow.sent == []
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_broadcast_sync_from_another_thread_reaches_ws_client(app_client):
+    with app_client.websocket_connect("/ws") as websocket:
+        main.manager.broadcast_sync(tick("NSE:NIFTY50-INDEX", 23500.5))
+        assert websocket.receive_json() == tick("NSE:NIFTY50-INDEX", 23500.5)
+
+
+def test_lagging_client_is_conflated_to_latest_tick_per_symbol():
+    async def scenario():
+        manager = ConnectionManager(SlowConsumerPolicy(max_queue=2, conflate=True, drop_lag_seconds=None))
+        slow = FakeWebSocket(delay=60)
+        client = await manager.connect(slow)
+
+        for i in range(1, 20):
+            manager.broadcast(tick("NSE:NIFTY50-INDEX" if i % 2 else "BSE:SENSEX-INDEX", i))
+
+        assert [json.loads(payload)["ltp"] for _, payload in client.pending.values()] == [1, 2, 19, 18]
+        assert manager.metrics()["conflated"] == 15
+        assert manager.metrics()["connections"][0]["pending"] == 4
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_client_is_dropped_after_lag_threshold():
+    async def scenario():
+        manager = ConnectionManager(SlowConsumerPolicy(max_queue=100, drop_lag_seconds=0.05))
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=60)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        manager.broadcast(tick("NSE:NIFTY50-INDEX", 1))
+        manager.broadcast(tick("NSE:NIFTY50-INDEX", 2))
+        await asyncio.sleep(0.1)
+        manager.broadcast(tick("NSE:NIFTY50-INDEX", 3))
+        await asyncio.sleep(0.01)
+
+        assert manager.active_connections == [fast]
+        assert slow.closed == LAGGING_CLOSE_CODE
+        assert manager.metrics()["dropped_clients"] == 1
+        assert [message["ltp"] for message in fast.sent] == [1, 2, 3]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_subscriptions_route_ticks_and_refcount_upstream(app_client, monkeypatch):
+    upstream = []
+    monkeypatch.setattr(main.manager, "_upstream_subscribe", lambda symbols: upstream.append(("sub", symbols)))
+    monkeypatch.setattr(main.manager, "_upstream_unsubscribe", lambda symbols: upstream.append(("unsub", symbols)))
+    option = "NSE:NIFTY2511623400CE"
+
+    with app_client.websocket_connect("/ws") as first, app_client.websocket_connect("/ws") as second:
+        first.send_json({"action": "subscribe", "symbols": [option, "NSE:NIFTY50-INDEX"]})
+        assert first.receive_json() == {"type": "subscribed", "symbols": [option, "NSE:NIFTY50-INDEX"]}
+        second.send_json({"action": "subscribe", "symbols": [option]})
+        assert second.receive_json() == {"type": "subscribed", "symbols": [option]}
+
+        main.manager.broadcast_sync(tick("BSE:SENSEX-INDEX", 1))
+        main.manager.broadcast_sync(tick(option, 2))
+        assert first.receive_json() == tick(option, 2)
+        assert second.receive_json() == tick(option, 2)
+
+        first.send_json({"action": "unsubscribe", "symbols": [option]})
+        assert first.receive_json() == {"type": "unsubscribed", "symbols": ["NSE:NIFTY50-INDEX"]}
+        second.send_json({"action": "resubscribe"})
+        assert second.receive_json()["type"] == "error"
+
+    # Upstream hooks run on the manager's feed-subscription worker
+    deadline = time.monotonic() + 1
+    while len(upstream) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Pinned index symbols never go upstream; the option is subscribed once and released once
+    assert upstream == [("sub", [option]), ("unsub", [option])]
+    assert main.manager.upstream_symbols() == []
+
+
+def test_upstream_calls_reach_the_feed_in_order():
+    calls = []
+
+    def slow_unsubscribe(symbols):
+        time.sleep(0.05)
+        calls.append(("unsub", symbols))
+
+    manager = ConnectionManager()
+    manager.set_upstream(lambda symbols: calls.append(("sub", symbols)), slow_unsubscribe)
+    option = "NSE:NIFTY2511623400CE"
+
+    manager.acquire_upstream([option])
+    manager.release_upstream([option])
+    manager.acquire_upstream([option])
+    manager._upstream_executor.shutdown(wait=True)
+
+    # A slow unsubscribe is never overtaken by the subscribe that followed it
+    assert calls == [("sub", [option]), ("unsub", [option]), ("sub", [option])]
+    assert manager.upstream_symbols() == [option]
+
+
+def test_subscribe_is_capped_per_client(app_client, monkeypatch):
+    monkeypatch.setattr(main.manager, "max_symbols", 3)
+    monkeypatch.setattr(main.manager, "_upstream_subscribe", None)
+    monkeypatch.setattr(main.manager, "_upstream_unsubscribe", None)
+
+    with app_client.websocket_connect("/ws") as websocket:
+        websocket.send_json({"action": "subscribe", "symbols": ["NSE:A-EQ", "NSE:B-EQ"]})
+        assert websocket.receive_json() == {"type": "subscribed", "symbols": ["NSE:A-EQ", "NSE:B-EQ"]}
+        websocket.send_json({"action": "subscribe", "symbols": ["NSE:B-EQ", "NSE:C-EQ", "NSE:D-EQ"]})
+        assert websocket.receive_json() == {"type": "error", "message": "At most 3 symbols per connection"}
+        # Nothing from the rejected request was subscribed
+        assert main.manager.upstream_symbols() == ["NSE:A-EQ", "NSE:B-EQ"]
+        websocket.send_json({"action": "subscribe", "symbols": ["NSE:B-EQ", "NSE:C-EQ"]})
+        assert websocket.receive_json() == {"type": "subscribed", "symbols": ["NSE:A-EQ", "NSE:B-EQ", "NSE:C-EQ"]}
+
+
+def test_each_tick_is_encoded_once_for_all_clients(monkeypatch):
+    import connection_manager
+    calls = []
+    encode = connection_manager.encode_message
+    monkeypatch.setattr(connection_manager, "encode_message", lambda message: calls.append(message) or encode(message))
+
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(5)]
+        for websocket in sockets:
+            await manager.connect(websocket)
+
+        manager.broadcast(tick("NSE:NIFTY50-INDEX", 1))
+        await asyncio.sleep(0.01)
+
+        assert len(calls) == 1
+        assert all(websocket.sent == [tick("NSE:NIFTY50-INDEX", 1)] for websocket in sockets)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_batched_client_gets_latest_tick_per_symbol_per_interval():
+    async def scenario():
+        manager = ConnectionManager()
+        batched, unbatched = FakeWebSocket(), FakeWebSocket()
+        client = await manager.connect(batched)
+        await manager.connect(unbatched)
+        client.set_batch_interval(100)
+
+        for i in range(10):
+            manager.broadcast(tick("NSE:NIFTY50-INDEX", i))
+            manager.broadcast(tick("NSE:NIFTYBANK-INDEX", 100 + i))
+        await asyncio.sleep(0.2)
+
+        assert len(unbatched.sent) == 20
+        assert batched.sent == [{"type": "batch", "updates": [
+            tick("NSE:NIFTY50-INDEX", 9), tick("NSE:NIFTYBANK-INDEX", 109),
+        ]}]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_batch_interval_from_query_and_action(app_client):
+    with app_client.websocket_connect("/ws?batch_ms=50") as websocket:
+        for i in range(5):
+            main.manager.broadcast_sync(tick("NSE:NIFTY50-INDEX", i))
+        assert websocket.receive_json() == {"type": "batch", "updates": [tick("NSE:NIFTY50-INDEX", 4)]}
+
+        websocket.send_text(json.dumps({"action": "batch", "interval_ms": 0}))
+        assert websocket.receive_json() == {"type": "batch_interval", "interval_ms": 0}
+        main.manager.broadcast_sync(tick("NSE:NIFTY50-INDEX", 5))
+        assert websocket.receive_json() == tick("NSE:NIFTY50-INDEX", 5)
+
+
+def test_snapshot_on_connect_and_on_subscribe(app_client):
+    option = "NSE:NIFTY2511623400CE"
+    with app_client.websocket_connect("/ws") as first:
+        main.manager.broadcast_sync(tick("NSE:NIFTY50-INDEX", 1))
+        main.manager.broadcast_sync(tick(option, 2))
+        main.manager.broadcast_sync(tick("NSE:NIFTY50-INDEX", 3))
+        assert [first.receive_json()["ltp"] for _ in range(3)] == [1, 2, 3]
+
+        with app_client.websocket_connect("/ws") as second:
+            assert second.receive_json() == {"type": "snapshot", "updates": [
+                tick("NSE:NIFTY50-INDEX", 3), tick(option, 2),
+            ]}
+
+        first.send_json({"action": "subscribe", "symbols": [option, "BSE:SENSEX-INDEX"]})
+        assert first.receive_json()["type"] == "subscribed"
+        assert first.receive_json() == {"type": "snapshot", "updates": [tick(option, 2)]}
+
+
+def test_delta_encoding_sends_full_record_once_then_changed_fields(app_client):
+    def quote(ltp, volume):
+        return {"symbol": "NSE:NIFTY50-INDEX", "ltp": ltp, "open": 23450.0, "volume": volume}
+
+    with app_client.websocket_connect("/ws?encoding=delta") as delta, app_client.websocket_connect("/ws") as plain:
+        for update in (quote(23500.0, 10), quote(23501.5, 10), quote(23501.5, 12)):
+            main.manager.broadcast_sync(update)
+
+        full = delta.receive_json()
+        symbol_id = full["id"]
+        assert full == {"id": symbol_id, **quote(23500.0, 10)}
+        assert delta.receive_json() == {"id": symbol_id, "ltp": 23501.5}
+        assert delta.receive_json() == {"id": symbol_id, "volume": 12}
+        assert [plain.receive_json() for _ in range(3)][-1] == quote(23501.5, 12)
+
+    with app_client.websocket_connect("/ws?encoding=delta") as late:
+        assert late.receive_json() == {"type": "snapshot", "updates": [{"id": symbol_id, **quote(23501.5, 12)}]}
+        main.manager.broadcast_sync(quote(23499.0, 12))
+        assert late.receive_json() == {"id": symbol_id, "ltp": 23499.0}
+
+
+def test_conflated_delta_client_falls_back_to_full_record():
+    async def scenario():
+        manager = ConnectionManager(SlowConsumerPolicy(max_queue=1, conflate=True, drop_lag_seconds=None))
+        slow = FakeWebSocket(delay=60)
+        client = await manager.connect(slow, encoding="delta")
+
+        manager.broadcast({"symbol": "A", "ltp": 1, "volume": 5})
+        manager.broadcast({"symbol": "A", "ltp": 2, "volume": 6})
+        manager.broadcast({"symbol": "A", "ltp": 2, "volume": 7})
+        await asyncio.sleep(0)
+
+        # The first frame went to the writer; the other two collapsed into one full record
+        (_, payload), = client.pending.values()
+        assert json.loads(payload) == {"id": 1, "symbol": "A", "ltp": 2, "volume": 7}
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_bars_are_routed_by_symbol_but_not_treated_as_ticks():
+    async def scenario():
+        manager = ConnectionManager()
+        websocket = FakeWebSocket()
+        client = await manager.connect(websocket, encoding="delta")
+        manager.subscribe(client, ["NSE:NIFTY50-INDEX"])
+
+        bar = {"type": "bar", "symbol": "NSE:NIFTY50-INDEX", "interval": "1m", "close": 1.0}
+        manager.broadcast(bar)
+        manager.broadcast({"type": "bar", "symbol": "NSE:NIFTYBANK-INDEX", "interval": "1m", "close": 2.0})
+        await asyncio.sleep(0.01)
+
+        assert websocket.sent == [bar]
+        assert manager.latest == {}
+        await manager.stop()
+
+    asyncio.run(scenario())
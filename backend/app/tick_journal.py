@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Roll the active journal into a Parquet segment after this many ticks or seconds
+SEGMENT_MAX_TICKS = 50_000
+SEGMENT_MAX_SECONDS = 300
+# How long the writer waits for ticks before flushing what it has
+FLUSH_INTERVAL = 0.5
+
+_STOP = object()
+
+
+class TickJournal:
+    """
+    Append-only record of every tick, written by a background thread.
+
+    record() only puts the tick on a queue, so the feed callback never touches disk.
+    The writer appends ticks as JSON lines to `active.jsonl` and rolls that file into an
+    immutable `ticks_<first>_<last>_<rolled ns>.parquet` segment once it holds
+    SEGMENT_MAX_TICKS ticks or is SEGMENT_MAX_SECONDS old. A journal left behind by a
+    crash is rolled on the next start.
+    """
+
+    def __init__(self, root: Path, max_ticks: int = SEGMENT_MAX_TICKS, max_seconds: float = SEGMENT_MAX_SECONDS):
+        self.root = Path(root)
+        self.max_ticks = max_ticks
+        self.max_seconds = max_seconds
+        self.wal_path = self.root / "active.jsonl"
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        # Held by the writer while it touches files, and by readers so they never see a half-rolled journal
+        self._lock = threading.Lock()
+        self._wal = None
+        self._wal_ticks = 0
+        self._wal_opened = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                self._roll()  # whatever a previous run left in the journal
+            self._thread = threading.Thread(target=self._run, name="tick-journal", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Write out queued ticks, roll the journal and stop the writer"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        self._thread = None
+
+    def record(self, tick: Dict):
+        """Queue a tick for the writer; never blocks on I/O"""
+        if self._thread is None:
+            self.start()
+        self._queue.put(tick)
+
+    def _run(self):
+        while True:
+            try:
+                ticks = [self._queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                ticks = []
+            while True:
+                try:
+                    ticks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(tick is _STOP for tick in ticks)
+            ticks = [tick for tick in ticks if tick is not _STOP]
+            try:
+                with self._lock:
+                    # Split a burst so no segment holds more than max_ticks
+                    while ticks:
+                        room = self.max_ticks - self._wal_ticks
+                        self._append(ticks[:room])
+                        ticks = ticks[room:]
+                        if self._wal_ticks >= self.max_ticks:
+                            self._roll()
+                    if stop or (self._wal_ticks and time.monotonic() - self._wal_opened >= self.max_seconds):
+                        self._roll()
+            except Exception as e:
+                logger.error(f"Error writing tick journal: {str(e)}")
+            if stop:
+                return
+
+    def _append(self, ticks: List[Dict]):
+        if self._wal is None:
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+            self._wal_opened = time.monotonic()
+        self._wal.write("".join(json.dumps(tick, separators=(",", ":")) + "\n" for tick in ticks))
+        self._wal.flush()
+        self._wal_ticks += len(ticks)
+
+    def _roll(self):
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        self._wal_ticks = 0
+
+        ticks = self._read_wal()
+        if not ticks.empty:
+            name = (f"ticks_{int(ticks['timestamp'].min())}_{int(ticks['timestamp'].max())}"
+                    f"_{time.time_ns()}.parquet")
+            tmp_path = self.root / (name + ".tmp")
+            ticks.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.root / name)
+            logger.info(f"Rolled {len(ticks)} ticks into {name}")
+        if self.wal_path.exists():
+            os.remove(self.wal_path)
+
+    def _read_wal(self) -> pd.DataFrame:
+        if not self.wal_path.exists():
+            return pd.DataFrame()
+        ticks = []
+        with open(self.wal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    ticks.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A crash can leave the last line half written
+                    logger.warning("Skipping torn line in tick journal")
+        return pd.DataFrame(ticks)
+
+    def segments(self) -> List[Path]:
+        return sorted(self.root.glob("ticks_*.parquet"), key=lambda path: int(path.stem.rsplit("_", 1)[1]))
+
+    def read(self, symbol: Optional[str] = None, start: Optional[int] = None, end: Optional[int] = None) -> pd.DataFrame:
+        """Journaled ticks with start <= timestamp < end, oldest first, skipping segments outside the range"""
+        frames = []
+        with self._lock:
+            for segment in self.segments():
+                _, first, last, _ = segment.stem.split("_")
+                if (start is not None and int(last) < start) or (end is not None and int(first) >= end):
+                    continue
+                filters = [("symbol", "==", symbol)] if symbol else None
+                frames.append(pd.read_parquet(segment, filters=filters))
+            frames.append(self._read_wal())
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        ticks = pd.concat(frames, ignore_index=True)
+        mask = pd.Series(True, index=ticks.index)
+        if symbol:
+            mask &= ticks["symbol"] == symbol
+        if start is not None:
+            mask &= ticks["timestamp"] >= start
+        if end is not None:
+            mask &= ticks["timestamp"] < end
+        return ticks[mask].reset_index(drop=True)
+
+    def last(self, symbol: str) -> Optional[Dict]:
+        """Most recent journaled tick for a symbol, searching newest files first"""
+        with self._lock:
+            ticks = self._read_wal()
+            if not ticks.empty:
+                ticks = ticks[ticks["symbol"] == symbol]
+            for segment in reversed(self.segments()):
+                if not ticks.empty:
+                    break
+                ticks = pd.read_parquet(segment, filters=[("symbol", "==", symbol)])
+        if ticks.empty:
+            return None
+        return ticks.iloc[-1].to_dict()
@@ -0,0 +1,94 @@
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Ticks kept in memory per symbol; older ones are overwritten (the journal keeps everything)
+DEFAULT_CAPACITY = 4096
+
+TICK_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("ltp", np.float64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("prev_close", np.float64),
+    ("change", np.float64),
+    ("change_percent", np.float64),
+    ("volume", np.int64),
+])
+TICK_FIELDS = TICK_DTYPE.names
+
+
+class TickRing:
+    """Fixed-capacity ring of one symbol's ticks in a NumPy structured array"""
+
+    __slots__ = ("ticks", "count", "head")
+
+    def __init__(self, capacity: int):
+        self.ticks = np.zeros(capacity, dtype=TICK_DTYPE)
+        self.count = 0  # ticks ever written
+        self.head = 0   # slot the next tick goes into
+
+    def append(self, tick: Dict):
+        self.ticks[self.head] = tuple(tick.get(field, 0) for field in TICK_FIELDS)
+        self.head = (self.head + 1) % len(self.ticks)
+        self.count += 1
+
+    def last(self, n: Optional[int] = None) -> np.ndarray:
+        """Copy of the newest n ticks (all held when None), oldest first"""
+        held = min(self.count, len(self.ticks))
+        n = held if n is None else min(n, held)
+        if n == 0:
+            return self.ticks[:0].copy()
+        indices = np.arange(self.head - n, self.head) % len(self.ticks)
+        return self.ticks[indices]
+
+
+class TickStore:
+    """
+    Latest tick plus a bounded tick history per symbol, held in memory.
+
+    Written from the feed callback thread and read from request handlers, so every
+    access takes one lock; appends are a single structured-array row assignment.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._rings: Dict[str, TickRing] = {}
+        self._latest: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol: str, tick: Dict):
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None:
+                ring = self._rings[symbol] = TickRing(self.capacity)
+            ring.append(tick)
+            self._latest[symbol] = tick
+
+    def latest(self, symbol: str) -> Optional[Dict]:
+        """The last update received for a symbol, as broadcast to clients"""
+        with self._lock:
+            return self._latest.get(symbol)
+
+    def ltp(self, symbol: str) -> Optional[float]:
+        tick = self.latest(symbol)
+        return tick.get("ltp") if tick is not None else None
+
+    def last(self, symbol: str, n: Optional[int] = None) -> np.ndarray:
+        """The newest n ticks for a symbol as a structured array, oldest first"""
+        with self._lock:
+            ring = self._rings.get(symbol)
+            if ring is None:
+                return np.zeros(0, dtype=TICK_DTYPE)
+            return ring.last(n)
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._rings)
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
+            self._latest.clear()